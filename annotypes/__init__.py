@@ -1,9 +1,15 @@
 from ._anno import Anno, NO_DEFAULT
-from ._array import Array, to_array, array_type
+from ._array import Array, ArrayBuilder, to_array, array_type, mmap_array
+from ._binary import BinaryCodec, binary_encode, binary_decode
 from ._calltypes import WithCallTypes, add_call_types, make_annotations
 from ._frozen_dict import FrozenOrderedDict
-from ._serializable import Serializable, serialize_object, deserialize_object, \
-    json_encode, json_decode, stringify_error
+from ._serializable import Serializable, serialize_object, \
+    deserialize_object, deserialize_typed, json_encode, json_encode_to, \
+    json_decode, json_decode_object, stringify_error, register_serializer, \
+    serialize_ndarray_base64, deserialize_ndarray, JSONCodec
+from ._structured import structured_dtype, to_structured_array, \
+    from_structured_array
+from ._table import Table
 from ._typing import (
     TYPE_CHECKING, TypeVar, Sequence, Union, Optional, Generic,
     overload, Mapping, Any, GenericMeta
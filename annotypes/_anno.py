@@ -2,10 +2,11 @@ import copy
 import sys
 
 from ._typing import TYPE_CHECKING, Union, MappingOrigin
-from ._array import Array, to_array
+from ._array import Array, SeqView, BUFFER_TYPES, to_array
 
 if TYPE_CHECKING:  # pragma: no cover
-    from typing import Dict, Set, Optional, Any, Sequence, Union, Type
+    from typing import Dict, Set, Optional, Any, Sequence, Union, Type, \
+        Iterable, FrozenSet, Tuple
 
 # Signifies that this is a return value and the default value should be inferred
 RETURN_DEFAULT = object()
@@ -13,6 +14,19 @@ RETURN_DEFAULT = object()
 # Signifies that no default value has been set
 NO_DEFAULT = object()
 
+# Whether namespace dicts remember insertion order, so the last name defined
+# can be found in O(1)
+ORDERED_DICTS = sys.version_info >= (3, 6)
+
+# Types of default whose equal values are interchangeable, so annos with
+# them can be shared. Not float as 0.0 == -0.0, or containers as (0, 1) ==
+# (0.0, 1.0). Includes long and unicode on Python2
+SHARED_DEFAULT_TYPES = frozenset(map(type, (None, True, 0, 2 ** 64, "", u"")))
+
+# Annos with defaults made by anno_with_default, keyed by (base anno,
+# type(default), default)
+_derived_annos = {}  # type: Dict[Tuple[Anno, type, Any], Anno]
+
 
 def anno_with_default(src, default=RETURN_DEFAULT):
     # type: (Any, Any) -> Anno
@@ -34,22 +48,28 @@ def anno_with_default(src, default=RETURN_DEFAULT):
     else:
         anno = src
     # Make a copy of the anno with the new default if needed
-    if default not in (RETURN_DEFAULT, NO_DEFAULT):
-        anno = copy.copy(anno)
-        anno.default = default
+    if default is not RETURN_DEFAULT and default is not NO_DEFAULT:
+        # Optional only forces default=None, so this key is enough to share
+        # identical derived annos. Include the type so 1 and True differ
+        if type(default) in SHARED_DEFAULT_TYPES:
+            key = (anno, type(default), default)  # type: Any
+            derived = _derived_annos.get(key)
+        else:
+            # Equal defaults may differ, like 0.0 and -0.0, so don't share
+            derived = key = None
+        if derived is None:
+            derived = copy.copy(anno)
+            derived.default = default
+            if key is not None:
+                _derived_annos[key] = derived
+        anno = derived
     return anno
 
 
 def caller_locals():
     # type: () -> Dict
-    """Return the frame object for the caller's stack frame."""
-    try:
-        raise ValueError
-    except ValueError:
-        _, _, tb = sys.exc_info()
-        assert tb, "Can't get traceback, this shouldn't happen"
-        caller_frame = tb.tb_frame.f_back.f_back
-        return caller_frame.f_locals
+    """Return the locals dict of the caller's caller's stack frame."""
+    return sys._getframe(2).f_locals
 
 
 def make_repr(inst, attrs):
@@ -67,13 +87,28 @@ def make_repr(inst, attrs):
 
 
 class Anno(object):
-    def __init__(self, description, name=None, default=NO_DEFAULT):
-        # type: (str, str, Any) -> None
+    __slots__ = [
+        "description", "name", "default", "typ", "is_array", "is_mapping",
+        "_names_on_enter", "_array_cls", "min", "max", "choices",
+        "min_length", "max_length", "_constrained"]
+
+    def __init__(self, description, name=None, default=NO_DEFAULT, min=None,
+                 max=None, choices=None, min_length=None, max_length=None):
+        # type: (str, str, Any, Any, Any, Iterable, int, int) -> None
         """Annotate a type with run-time accessible metadata
 
         Args:
             description: A one-line description for the argument
             name: The name of the Anno, can also be set via context manager
+            default: The default value if not supplied
+            min: If given, the value (or each element of an array) must be >=
+            max: If given, the value (or each element of an array) must be <=
+            choices: If given, the value (or each element of an array) must
+                be one of these
+            min_length: If given, the value (an array or str) must be at least
+                this long
+            max_length: If given, the value (an array or str) must be at most
+                this long
         """
         self.description = description  # type: str
         self.name = name  # type: Optional[str]
@@ -81,18 +116,92 @@ class Anno(object):
         self.typ = None  # type: Any
         self.is_array = False  # type: Optional[bool]
         self.is_mapping = False  # type: Optional[bool]
-        self._names_on_enter = None  # type: Optional[Set[str]]
+        # Snapshot of the caller's namespace while used as a context manager
+        self._names_on_enter = None  # type: Optional[Union[int, Set[str]]]
         self._array_cls = None  # type: Optional[Type[Array]]
-        # TODO: add min, max, maybe widget
+        self.min = min  # type: Any
+        self.max = max  # type: Any
+        self.choices = None  # type: Optional[FrozenSet]
+        if choices is not None:
+            self.choices = frozenset(choices)
+        self.min_length = min_length  # type: Optional[int]
+        self.max_length = max_length  # type: Optional[int]
+        # So unconstrained calls don't pay for validate()
+        self._constrained = not (
+            min is None and max is None and choices is None and
+            min_length is None and max_length is None)
+        # TODO: maybe widget
 
     def __call__(self, *args, **kwargs):
-        """Pass calls through to our underlying type"""
+        """Pass calls through to our underlying type, validating the result
+        against our constraints"""
         if self.is_array:
-            return to_array(Array[self.typ], *args, **kwargs)
+            value = to_array(Array[self.typ], *args, **kwargs)
         elif self.is_mapping:
             raise TypeError("Type Mapping cannot be instantiated")
         else:
-            return self.typ(*args, **kwargs)
+            value = self.typ(*args, **kwargs)
+        if self._constrained:
+            self.validate(value)
+        return value
+
+    def validate(self, value):
+        # type: (Any) -> None
+        """Raise ValueError if value doesn't meet our constraints. Array
+        values are checked with a single numpy reduction, or one pass over
+        their typed storage, rather than element by element"""
+        if self.min_length is not None and len(value) < self.min_length:
+            raise ValueError("%s: Expected length >= %s, got %s" % (
+                self.name, self.min_length, len(value)))
+        if self.max_length is not None and len(value) > self.max_length:
+            raise ValueError("%s: Expected length <= %s, got %s" % (
+                self.name, self.max_length, len(value)))
+        if self.is_array:
+            seq = value.seq
+            if isinstance(seq, SeqView):
+                seq = seq.materialize()
+            if len(seq) == 0:
+                return
+            if isinstance(seq, BUFFER_TYPES):
+                # View typed buffers with numpy if we can, so the checks
+                # don't box each element
+                try:
+                    import numpy as np
+                except ImportError:
+                    pass
+                else:
+                    seq = np.asarray(seq)
+        else:
+            seq = [value]
+        is_numpy = hasattr(seq, "dtype")
+        # Written as "not in range" so NaN, which compares False to
+        # everything, is a violation. numpy min() and max() propagate NaN,
+        # but the builtins don't, so look for the first bad element instead
+        if self.min is not None:
+            if is_numpy:
+                lo = seq.min()
+            else:
+                lo = next((x for x in seq if not x >= self.min), self.min)
+            if not lo >= self.min:
+                raise ValueError("%s: Expected values >= %r, got %r" % (
+                    self.name, self.min, lo))
+        if self.max is not None:
+            if is_numpy:
+                hi = seq.max()
+            else:
+                hi = next((x for x in seq if not x <= self.max), self.max)
+            if not hi <= self.max:
+                raise ValueError("%s: Expected values <= %r, got %r" % (
+                    self.name, self.max, hi))
+        if self.choices is not None:
+            if is_numpy:
+                import numpy as np
+                bad = list(seq[~np.isin(seq, list(self.choices))][:1])
+            else:
+                bad = list(set(seq) - self.choices)
+            if bad:
+                raise ValueError("%s: Expected values in %s, got %r" % (
+                    self.name, sorted(self.choices, key=repr), bad[0]))
 
     def __repr__(self):
         attrs = ["name", "typ", "description"]
@@ -111,13 +220,29 @@ class Anno(object):
         >>> if not TYPE_CHECKING:
         ...     MyArg = Anno("The arg to take", name="MyArg").set_typ(str)
         """
-        self._names_on_enter = set(caller_locals())
+        locals_d = caller_locals()
+        if ORDERED_DICTS and isinstance(locals_d, dict):
+            # Just remember the size, the new name will be the last key
+            self._names_on_enter = len(locals_d)
+        else:
+            self._names_on_enter = set(locals_d)
 
-    def _get_defined_name(self, locals_d):
-        defined = set(locals_d) - self._names_on_enter
-        assert len(defined) == 1, \
-            "Expected a single type to be defined, got %s" % list(defined)
-        self.name = defined.pop()
+    def _pop_defined(self, locals_d):
+        # type: (Dict) -> Tuple[str, Any]
+        names_on_enter, self._names_on_enter = self._names_on_enter, None
+        if isinstance(names_on_enter, int):
+            n_defined = len(locals_d) - names_on_enter
+            assert n_defined == 1, \
+                "Expected a single type to be defined, got %d" % n_defined
+            # popitem() takes the most recently inserted item in O(1)
+            return locals_d.popitem()
+        else:
+            assert names_on_enter is not None, "Not used as a context manager"
+            defined = set(locals_d) - names_on_enter
+            assert len(defined) == 1, \
+                "Expected a single type to be defined, got %s" % list(defined)
+            name = defined.pop()
+            return name, locals_d.pop(name)
 
     def set_typ(self, typ, is_array=False, is_mapping=False):
         self.typ = typ
@@ -149,7 +274,6 @@ class Anno(object):
         if exc_type is not None:
             return False
         locals_d = caller_locals()
-        self._get_defined_name(locals_d)
-        self._get_type(locals_d[self.name])
+        self.name, typ = self._pop_defined(locals_d)
+        self._get_type(typ)
         locals_d[self.name] = self
-
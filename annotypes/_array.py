@@ -1,15 +1,45 @@
 import array
+import hashlib
+import mmap
+import struct
+import sys
+from itertools import islice
 
-from ._compat import str_
+from ._compat import str_, intern_
 from ._typing import TYPE_CHECKING, overload, Sequence, TypeVar, Generic, \
-    NEW_TYPING
-from ._stackinfo import find_caller_class
+    NEW_TYPING, Iterator
 
 if TYPE_CHECKING:  # pragma: no cover
-    from typing import Union, Type
+    from typing import Union, Type, Dict, Any, Tuple, IO, Optional, Iterable, \
+        List
 
 T = TypeVar("T")
 
+# Python2 memoryviews can't be cast, so typed buffers need Python3
+CAN_CAST = hasattr(memoryview, "cast")
+
+# Python2 xranges can't be sliced, so SeqViews need Python3
+VIEWABLE = (list, tuple, array.array) if sys.version_info >= (3,) else ()
+
+# Types that support the buffer protocol and compare elementwise by value
+BUFFER_TYPES = (memoryview, array.array)
+
+# Compare numpy arrays this many elements at a time
+NEQ_CHUNK = 65536
+
+# Pull this many elements at a time when consuming an iterator
+INGEST_CHUNK = 4096
+
+# Element types whose repr exactly describes their value
+REPR_DIGEST_TYPES = (bool, int, float, str_)
+
+# struct format characters that can store the builtin types, preferred first
+BUFFER_FORMATS = {
+    bool: ("?",),
+    int: tuple(f for f in "ql" if struct.calcsize(f) == 8),
+    float: ("d",),
+}  # type: Dict[Any, Tuple[str, ...]]
+
 
 def array_type(cls):
     # type: (Type[Array[T]]) -> Type[T]
@@ -19,7 +49,178 @@ def array_type(cls):
     return type_args[0]
 
 
+def buffer_formats(typ):
+    # type: (Any) -> Tuple[str, ...]
+    """Return the struct format characters that can store elements of typ in
+    a buffer, preferred first. Empty if typ can't be stored in a buffer"""
+    formats = BUFFER_FORMATS.get(typ, ())
+    if not formats and hasattr(typ, "dtype"):
+        # It's a numpy scalar type like np.float32
+        formats = (typ(0).dtype.char,)
+    return formats
+
+
+def typed_memoryview(typ, buf):
+    # type: (Any, Any) -> memoryview
+    """Make a zero-copy memoryview of buf whose elements are of type typ
+
+    Args:
+        typ: The type of the elements, like float or np.int32
+        buf: Anything supporting the buffer protocol, like bytes, bytearray,
+            mmap, array.array or a numpy array
+    """
+    formats = buffer_formats(typ)
+    assert formats, "Can't store %s in a buffer" % (typ,)
+    view = memoryview(buf)  # type: Any
+    if view.format not in formats:
+        # Can only cast between formats via bytes
+        view = view.cast("B").cast(formats[0])
+    return view
+
+
+class SeqView(object):
+    """Immutable view of a slice of a list, tuple or array.array that shares
+    its storage rather than copying it"""
+
+    __slots__ = ["seq", "indices"]
+
+    def __init__(self, seq, indices):
+        # type: (Sequence, range) -> None
+        self.seq = seq
+        # The range of indices into seq that we are viewing
+        self.indices = indices
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        if item.__class__ is slice:
+            return SeqView(self.seq, self.indices[item])
+        else:
+            return self.seq[self.indices[item]]
+
+    def __iter__(self):
+        seq = self.seq
+        return (seq[i] for i in self.indices)
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def materialize(self):
+        # type: () -> Sequence
+        """Return a copy of the slice, of the same type as the viewed seq"""
+        indices = self.indices
+        if indices.stop < 0:
+            # Stepping backwards to the start of seq
+            return self.seq[indices.start::indices.step]
+        else:
+            return self.seq[indices.start:indices.stop:indices.step]
+
+
+def compact_seq(typ, seq):
+    # type: (Any, Sequence) -> Any
+    """Return a more compact copy of seq if every element is exactly of type
+    typ, otherwise return seq. Numbers are packed into an array.array, bools
+    into a memoryview, and strings are interned so repeats are shared"""
+    if set(map(type, seq)) != {typ}:
+        return seq
+    elif typ is str:
+        return list(map(intern_, seq))
+    elif typ is bool:
+        if CAN_CAST:
+            return typed_memoryview(bool, bytearray(seq))
+    elif typ in (int, float):
+        try:
+            return array.array(BUFFER_FORMATS[typ][0], seq)
+        except (ValueError, OverflowError):
+            # Python2 has no 64-bit typecode, or ints are too big to pack
+            pass
+    return seq
+
+
+def empty_storage(typ):
+    # type: (Any) -> Any
+    """Return empty growable storage that packs elements of typ. This is an
+    array.array for int and float, a bytearray for bool, otherwise a list"""
+    if typ is bool and CAN_CAST:
+        return bytearray()
+    elif typ in (int, float):
+        try:
+            return array.array(BUFFER_FORMATS[typ][0])
+        except ValueError:
+            # Python2 has no 64-bit typecode
+            pass
+    return []
+
+
+def ingest_iterator(typ, it, compact=False):
+    # type: (Any, Iterator, bool) -> Any
+    """Consume an iterator into the storage compact_seq() would make from a
+    list of its elements, without making that list. Elements are pulled a
+    chunk at a time and extended into an array.array or bytearray, until an
+    element isn't exactly typ when we fall back to a list. Strings are only
+    interned if compact is True"""
+    storage = empty_storage(typ)
+    for chunk in iter(lambda: list(islice(it, INGEST_CHUNK)), []):
+        if storage.__class__ is not list:
+            if set(map(type, chunk)) == {typ}:
+                length = len(storage)
+                try:
+                    storage.extend(chunk)
+                    continue
+                except OverflowError:
+                    # Int too big to pack, remove any that got added
+                    del storage[length:]
+            # Can't pack this chunk, so fall back to a list
+            if storage.__class__ is bytearray:
+                storage = list(map(bool, storage))
+            else:
+                storage = storage.tolist()
+        if compact and typ is str:
+            chunk = compact_seq(typ, chunk)
+        storage.extend(chunk)
+    if storage.__class__ is bytearray:
+        storage = typed_memoryview(bool, storage)
+    return storage
+
+
 def seq_neq(seq, other):
+    if seq is other:
+        return False
+    if isinstance(seq, SeqView):
+        seq = seq.materialize()
+    if isinstance(other, SeqView):
+        other = other.materialize()
+    try:
+        if len(seq) != len(other):
+            return True
+    except TypeError:
+        # One of them isn't sized, so leave it to the native compare
+        pass
+    if hasattr(seq, "dtype") and hasattr(other, "dtype"):
+        # Both numpy arrays, compare a chunk at a time so the boolean array
+        # of differences stays small, and we can stop at the first one
+        if seq.shape != other.shape:
+            return True
+        elif seq.shape:
+            for i in range(0, len(seq), NEQ_CHUNK):
+                if (seq[i:i + NEQ_CHUNK] != other[i:i + NEQ_CHUNK]).any():
+                    return True
+            return False
+    elif isinstance(seq, BUFFER_TYPES) or isinstance(other, BUFFER_TYPES):
+        if isinstance(seq, (list, tuple)):
+            # Buffers only compare equal to other buffers, so compare as lists
+            seq, other = list(seq), other.tolist()
+        elif isinstance(other, (list, tuple)):
+            seq, other = seq.tolist(), list(other)
+        else:
+            # memoryviews compare elementwise without making new objects
+            try:
+                return memoryview(seq) != memoryview(other)
+            except (TypeError, ValueError, NotImplementedError):
+                # Python2 buffer, or a format memoryview can't compare
+                pass
     # Do the native compare
     not_equal = seq != other
     if hasattr(not_equal, "any"):
@@ -29,28 +230,129 @@ def seq_neq(seq, other):
     return not_equal
 
 
+def seq_digest(typ, seq):
+    # type: (Any, Any) -> Optional[bytes]
+    """Return a SHA1 digest of the elements of seq, or None if seq is not a
+    buffer and its elements have no exact repr"""
+    if isinstance(seq, SeqView):
+        seq = seq.materialize()
+    h = hashlib.sha1()
+    try:
+        view = memoryview(seq)  # type: Any
+    except (TypeError, ValueError):
+        # Not a buffer, so digest the repr if it exactly describes the values
+        if typ not in REPR_DIGEST_TYPES:
+            return None
+        h.update(repr(seq).encode("utf-8"))
+    else:
+        # Include the layout so different formats give different digests
+        h.update(("%s %s:" % (view.format, view.shape)).encode("utf-8"))
+        try:
+            h.update(view)
+        except (TypeError, ValueError, BufferError):
+            # Not contiguous, or Python2 hashlib can't take a memoryview
+            h.update(view.tobytes())
+    return h.digest()
+
+
+def contains_nan(typ, seq):
+    # type: (Any, Any) -> bool
+    """Return True if any elements of seq are NaN, which isn't equal to
+    itself, so equal digests don't mean equal elements"""
+    if hasattr(typ, "dtype"):
+        # It's a numpy scalar type like np.float32
+        if typ(0).dtype.kind not in "fc":
+            return False
+    elif not (isinstance(typ, type) and issubclass(typ, (float, complex))):
+        return False
+    if isinstance(seq, SeqView):
+        seq = seq.materialize()
+    if hasattr(seq, "dtype"):
+        return bool((seq != seq).any())
+    return any(x != x for x in seq)
+
+
+# Concrete Array[<typ>] subclasses created by Array.__class_getitem__
+_specialized = {}  # type: Dict[Any, Any]
+
+
+def _make_array(typ, seq, buffer=False):
+    # Used to unpickle an Array as its class is made on the fly
+    if buffer:
+        # It was pickled from a memoryview as a bytearray, so recast it
+        seq = memoryview(seq)
+    return to_array(Array[typ], seq)
+
+
 class Array(Sequence[T], Generic[T]):
     """Wrapper that takes a sequence and provides immutable access to it"""
 
+    # The type of the elements, set on each concrete Array[<typ>] subclass
+    typ = None  # type: Type[T]
+
+    # Digest of the elements, set by digest()
+    _digest = None  # type: Optional[bytes]
+
+    # Whether the elements contained NaN when digest() was called
+    _digest_nan = True
+
     def __len__(self):
         # type () -> int
         return len(self.seq)
 
+    if NEW_TYPING:
+        def __new__(cls, *args, **kwargs):
+            # Skip Generic.__new__ as we don't need any of its checks
+            return object.__new__(cls)
+
+        def __class_getitem__(cls, params):
+            # In python 3.7 Array[<typ>] would be a _GenericAlias that calls
+            # our __init__ before setting __orig_class__, so we wouldn't know
+            # our typ. Instead make (and cache) a real subclass with typ set
+            # so that instantiation needs no introspection
+            try:
+                return _specialized[cls, params]
+            except (KeyError, TypeError):
+                pass
+            alias = super(Array, cls).__class_getitem__(params)
+            if alias.__parameters__:
+                # Still generic, like Array[T], so leave it to typing
+                return alias
+            typ = alias.__args__[0]
+            specialized = type(cls)(cls.__name__, (cls,), dict(
+                __module__=cls.__module__,
+                __qualname__="%s[%s]" % (
+                    cls.__name__, getattr(typ, "__name__", repr(typ))),
+                __origin__=cls,
+                __args__=alias.__args__,
+                typ=typ))
+            try:
+                _specialized[cls, params] = specialized
+            except TypeError:
+                # Unhashable params, can't cache
+                pass
+            return specialized
+
     def __init__(self, seq=None):
         if seq is None:
             seq = []
         self.seq = seq  # type: Sequence[T]
         if NEW_TYPING:
-            orig_class = find_caller_class(__file__)
+            assert self.typ is not None, \
+                "You should instantiate Array[<typ>](...)"
         else:
             orig_class = getattr(self, "__orig_class__", None)
-        assert orig_class, "You should instantiate Array[<typ>](...)"
-        self.typ = array_type(orig_class)
+            assert orig_class, "You should instantiate Array[<typ>](...)"
+            self.typ = array_type(orig_class)
         # TODO: add type checking for array.array
         if hasattr(seq, "dtype"):
             assert self.typ == seq.dtype, \
                 "Expected numpy array with dtype %s, got %r with dtype %s" % (
                     self.typ, seq, seq.dtype)
+        elif seq.__class__ is memoryview:
+            assert seq.format in buffer_formats(self.typ), \
+                "Expected memoryview with format %s, got %r with format %s" % (
+                    "/".join(buffer_formats(self.typ)), seq, seq.format)
 
     @overload
     def __getitem__(self, idx):  # pragma: no cover
@@ -59,21 +361,43 @@ class Array(Sequence[T], Generic[T]):
 
     @overload
     def __getitem__(self, s):  # pragma: no cover
-        # type: (slice) -> Sequence[T]
+        # type: (slice) -> Array[T]
         pass
 
     def __getitem__(self, item):
+        if item.__class__ is slice:
+            # Return an Array of the same type viewing our storage
+            seq = self.seq
+            if seq.__class__ in VIEWABLE:
+                seq = SeqView(seq, range(len(seq))[item])
+            else:
+                # SeqViews, numpy arrays and memoryviews slice without copying
+                seq = seq[item]
+            if NEW_TYPING:
+                return self.__class__(seq)
+            else:
+                return self.__orig_class__(seq)
         return self.seq[item]
 
+    def __iter__(self):
+        return iter(self.seq)
+
     def __eq__(self, other):
         # type: (object) -> bool
         return not self != other
 
     def __ne__(self, other):
         # type: (object) -> bool
-        if isinstance(other, Array):
+        if other is self:
+            return False
+        elif isinstance(other, Array):
             if self.typ != other.typ:
                 return True
+            elif self._digest is not None and \
+                    self._digest == other._digest and not self._digest_nan:
+                # Both have been digested and have the same elements. NaN
+                # isn't equal to itself, so if there is any we compare
+                return False
             other = other.seq
         not_equal = seq_neq(self.seq, other)
         return not_equal
@@ -81,25 +405,285 @@ class Array(Sequence[T], Generic[T]):
     def __repr__(self):
         return "Array(%r)" % (self.seq,)
 
+    def digest(self):
+        # type: () -> Optional[bytes]
+        """Return a digest of the elements, calculated on the first call and
+        then cached. If two Arrays have been digested, comparing them is O(1)
+        when their elements are the same, unless they contain NaN. None if the
+        elements can't be digested, see seq_digest()
+
+        Arrays are meant to be immutable, if the underlying storage is changed
+        in place after calling this then the cached digest will be stale
+        """
+        if self._digest is None:
+            self._digest = seq_digest(self.typ, self.seq)
+            if self._digest is not None:
+                self._digest_nan = contains_nan(self.typ, self.seq)
+        return self._digest
+
+    def __reduce__(self):
+        seq = self.seq
+        if isinstance(seq, SeqView):
+            # Only pickle the part we are viewing
+            seq = seq.materialize()
+        elif isinstance(seq, memoryview):
+            # Can't pickle memoryviews, so pickle the bytes to be recast
+            return _make_array, (self.typ, bytearray(seq), True)
+        return _make_array, (self.typ, seq)
+
+    def __array__(self, dtype=None, copy=None):
+        # Called by np.asarray(arr), so hand numpy our storage without a copy
+        # if it is a numpy array or supports the buffer protocol
+        import numpy as np
+        seq = self.seq
+        if isinstance(seq, SeqView):
+            seq = seq.materialize()
+        if copy:
+            return np.array(seq, dtype=dtype)
+        else:
+            return np.asarray(seq, dtype=dtype)
+
+    def __buffer__(self, flags):
+        # Python3.12 onwards will call this from memoryview(arr)
+        return self.memoryview()
+
+    def memoryview(self):
+        # type: () -> Any
+        """Return a memoryview of our storage without copying it. Raises
+        TypeError if the storage doesn't support the buffer protocol, like a
+        list, so needs copying into one, see to_array(..., compact=True)"""
+        seq = self.seq  # type: Any
+        if isinstance(seq, SeqView):
+            indices = seq.indices
+            # A stop of -1 means stepping backwards to the start of seq
+            stop = None if indices.stop < 0 else indices.stop
+            seq = seq.seq
+            return memoryview(seq)[indices.start:stop:indices.step]
+        return memoryview(seq)
+
+
+class ArrayBuilder(Generic[T]):
+    """Grow typed storage by appending elements, then freeze() it into an
+    Array[T] without copying. Instantiate as ArrayBuilder[<typ>]()
+
+    ints and floats are stored in an array.array, bools in a bytearray, numpy
+    scalar types in a numpy array that doubles in size when full, and anything
+    else in a list. If an element can't be packed, like an int too big for
+    the array.array, the elements so far are moved to a list
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._storage = None  # type: Any
+        # The number of elements used in numpy storage
+        self._length = 0
+        # The Array returned by freeze(), sharing our storage
+        self._frozen = None  # type: Optional[Array[T]]
+
+    @property
+    def typ(self):
+        # type: () -> Type[T]
+        # Python3.7 sets __orig_class__ after __init__, so look it up here
+        orig_class = getattr(self, "__orig_class__", None)
+        assert orig_class, "You should instantiate ArrayBuilder[<typ>]()"
+        return array_type(orig_class)
+
+    def __len__(self):
+        # type: () -> int
+        if hasattr(self._storage, "dtype"):
+            return self._length
+        elif self._storage is None:
+            return 0
+        else:
+            return len(self._storage)
+
+    def _writable_storage(self):
+        # type: () -> Any
+        storage = self._storage
+        if storage is None:
+            typ = self.typ
+            if hasattr(typ, "dtype"):
+                # numpy scalar type, so numpy must be available
+                import numpy as np
+                storage = np.empty(16, dtype=typ)
+            else:
+                storage = empty_storage(typ)
+        elif self._frozen is not None and not hasattr(storage, "dtype"):
+            # The frozen Array shares our storage, so copy on write. numpy
+            # storage doesn't need this as frozen is a view of the used part
+            storage = storage[:]
+        self._frozen = None
+        self._storage = storage
+        return storage
 
-def to_array(typ, seq=None):
-    # type: (Type[Array[T]], Union[Array[T], Sequence[T], T]) -> Array[T]
+    def _grow_numpy(self, length):
+        # type: (int) -> Any
+        import numpy as np
+        old = self._storage
+        storage = np.empty(max(length, 2 * len(old)), dtype=old.dtype)
+        storage[:self._length] = old[:self._length]
+        self._storage = storage
+        return storage
+
+    def _list_storage(self):
+        # type: () -> List
+        """Swap packed storage for a list, for elements it can't hold"""
+        storage = self._storage
+        if storage.__class__ is bytearray:
+            storage = list(map(bool, storage))
+        else:
+            storage = storage.tolist()
+        self._storage = storage
+        return storage
+
+    def append(self, value):
+        # type: (T) -> None
+        """Append a single element"""
+        storage = self._writable_storage()
+        if hasattr(storage, "dtype"):
+            if self._length == len(storage):
+                storage = self._grow_numpy(self._length + 1)
+            storage[self._length] = value
+            self._length += 1
+        elif storage.__class__ is list:
+            storage.append(value)
+        else:
+            try:
+                storage.append(value)
+            except (OverflowError, TypeError, ValueError):
+                # Too big to pack, or not a number, so fall back to a list
+                self._list_storage().append(value)
+
+    def extend(self, values):
+        # type: (Iterable[T]) -> None
+        """Append all the elements of a sequence or iterator"""
+        storage = self._writable_storage()
+        if storage.__class__ is list:
+            storage.extend(values)
+        elif isinstance(values, Iterator):
+            # Consume a chunk at a time so we know how much to grow by, and
+            # don't lose elements if we have to fall back to a list
+            for chunk in iter(lambda: list(islice(values, INGEST_CHUNK)), []):
+                self.extend(chunk)
+        elif not hasattr(storage, "dtype"):
+            length = len(storage)
+            try:
+                storage.extend(values)
+            except (OverflowError, TypeError, ValueError):
+                # Can't pack these, remove any that got added and fall back
+                # to a list
+                del storage[length:]
+                self._list_storage().extend(values)
+        else:
+            import numpy as np
+            values = np.asarray(values, dtype=storage.dtype)
+            length = self._length + len(values)
+            if length > len(storage):
+                storage = self._grow_numpy(length)
+            storage[self._length:length] = values
+            self._length = length
+
+    def freeze(self):
+        # type: () -> Array[T]
+        """Return an Array[T] of the elements so far that shares our storage
+        rather than copying it. Appending afterwards won't change it"""
+        if self._frozen is None:
+            storage = self._storage
+            if hasattr(storage, "dtype"):
+                storage = storage[:self._length]
+            elif storage.__class__ is bytearray:
+                storage = typed_memoryview(bool, storage)
+            self._frozen = to_array(Array[self.typ], storage)  # type: ignore
+        return self._frozen
+
+
+def to_array(typ, seq=None, compact=False):
+    # type: (Type[Array[T]], Union[Array[T], Sequence[T], T], bool) -> Array[T]
+    """Make an Array of type typ from seq, without copying if possible
+
+    Args:
+        typ: The Array type to make, like Array[float]
+        seq: An Array, ArrayBuilder, sequence, iterator, memoryview or single
+            element. A memoryview is cast to typ's format without copying,
+            so memoryview(b) reinterprets the bytes of b as elements
+        compact: If True then pack a list or tuple of numbers or bools into
+            typed storage, and intern a list of strings. See compact_seq().
+            Iterators are always consumed into typed storage if possible,
+            see ingest_iterator()
+    """
     expected = array_type(typ)
-    if hasattr(seq, "dtype") or isinstance(seq, array.array):
+    if isinstance(seq, (list, tuple)):
+        # The most common case, so check it first without going through ABCs
+        if not seq:
+            return typ()
+        elif compact:
+            seq = compact_seq(expected, seq)
+        return typ(seq)
+    elif isinstance(seq, array.array) or hasattr(seq, "dtype"):
         # It's a numpy array or stdlib array
         return typ(seq)
+    elif CAN_CAST and isinstance(seq, memoryview) and buffer_formats(expected):
+        # It's a buffer we can cast without copying
+        return typ(typed_memoryview(expected, seq))
     elif isinstance(seq, Array):
         assert expected == seq.typ, \
             "Expected Array[%s], got Array[%s]" % (expected, seq.typ)
         return seq
+    elif isinstance(seq, ArrayBuilder):
+        assert expected == seq.typ, \
+            "Expected ArrayBuilder[%s], got ArrayBuilder[%s]" % (
+                expected, seq.typ)
+        return seq.freeze()
     elif seq is None:
         return typ()
-    elif isinstance(seq, str_) or not isinstance(seq, Sequence):
+    elif isinstance(seq, str_):
+        # Wrap it in a list as it should be a sequence
+        return typ([seq])
+    elif isinstance(seq, Iterator):
+        # It's a generator or other iterator, so consume it
+        return typ(ingest_iterator(expected, seq, compact))
+    elif not isinstance(seq, Sequence):
         # Wrap it in a list as it should be a sequence
         return typ([seq])
     elif len(seq) == 0:
         # Zero length array
         return typ()
     else:
-        # It's a sequence, so assume it's ok
+        # It's some other sequence, so assume it's ok
         return typ(seq)
+
+
+def mmap_array(typ, f, offset=0, count=None):
+    # type: (Type[Array[T]], Union[str, IO], int, Optional[int]) -> Array[T]
+    """Make an Array that lazily reads its elements from a file region
+
+    The file is memory mapped read-only, so this returns without reading any
+    data, and pages of the file are only read when elements are accessed.
+
+    Args:
+        typ: The Array type to make, like Array[float]
+        f: The path of the file, or an open file object
+        offset: The byte offset in the file of the first element
+        count: The number of elements, defaults to the rest of the file
+    """
+    assert CAN_CAST, "Memory mapped Arrays need Python3"
+    if isinstance(f, str_):
+        # mmap keeps its own handle to the file, so we can close ours
+        with open(f, "rb") as fobj:
+            return mmap_array(typ, fobj, offset, count)
+    expected = array_type(typ)
+    formats = buffer_formats(expected)
+    assert formats, "Can't store %s in a buffer" % (expected,)
+    if count == 0:
+        # Can't mmap zero bytes
+        return typ()
+    # The mmap has to start on a multiple of the allocation granularity
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    if count is None:
+        # Map to the end of the file
+        length = 0
+    else:
+        length = offset - start + count * struct.calcsize(formats[0])
+    mm = mmap.mmap(
+        f.fileno(), length, access=mmap.ACCESS_READ, offset=start)  # type: Any
+    return typ(typed_memoryview(expected, memoryview(mm)[offset - start:]))
@@ -0,0 +1,464 @@
+import array
+import struct
+import sys
+
+from ._array import Array, SeqView, CAN_CAST, buffer_formats, compact_seq, \
+    typed_memoryview, to_array
+from ._compat import str_
+from ._frozen_dict import FrozenOrderedDict, key_tuple
+from ._serializable import Serializable, serialize_object, \
+    uses_default_method, make_object_maker
+from ._typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Dict, List, Any, Tuple, Optional, Callable, Iterable, \
+        Type
+
+# Like MessagePack, a first byte below FIXINT_END is the value of a small
+# positive int, otherwise it is one of these tags
+FIXINT_END = 0x80
+NONE, FALSE, TRUE, INT8, INT16, INT32, INT64, BIGINT, FLOAT, STR, BYTES, \
+    LIST, DICT, OBJECT, NEW_TYPEID, ARRAY, ARRAY_OUT_OF_BAND = range(
+        FIXINT_END, FIXINT_END + 17)
+
+# Each byte value as a bytes object
+BYTE_VALUES = [bytes(bytearray([i])) for i in range(256)]
+
+# Sized ints, in the order they are tried
+INT_STRUCTS = [
+    (INT8, struct.Struct("<b")), (INT16, struct.Struct("<h")),
+    (INT32, struct.Struct("<i")), (INT64, struct.Struct("<q"))]
+INT_LIMITS = [(tag, -2 ** (s.size * 8 - 1), 2 ** (s.size * 8 - 1), s.pack)
+              for tag, s in INT_STRUCTS]
+INT_UNPACKS = dict((tag, (s.unpack_from, s.size)) for tag, s in INT_STRUCTS)
+F64 = struct.Struct("<d")
+
+NATIVE_ORDER = "<" if sys.byteorder == "little" else ">"
+
+# {(kind, itemsize): struct format character of that size on every platform}
+SIZED_FORMATS = {
+    ("b", 1): "?",
+    ("i", 1): "b", ("i", 2): "h", ("i", 4): "i", ("i", 8): "q",
+    ("u", 1): "B", ("u", 2): "H", ("u", 4): "I", ("u", 8): "Q",
+    ("f", 4): "f", ("f", 8): "d",
+}  # type: Dict[Tuple[str, int], str]
+
+# {struct format character: numpy style kind}
+FORMAT_KINDS = dict(
+    [("?", "b"), ("f", "f"), ("d", "f")] +
+    [(c, "i") for c in "bhilq"] + [(c, "u") for c in "BHILQ"])
+
+# Lists of numbers and bools shorter than this are sent element by element
+# rather than packed into a buffer, as small ints only take a byte each
+PACK_LIST_MIN = 32
+
+# Element types of Arrays that are sent by name
+BUILTIN_TYPES = dict(bool=bool, int=int, float=float)
+
+
+def pack_varint(n):
+    # type: (int) -> bytes
+    """Pack a non-negative int 7 bits at a time, least significant first,
+    with the top bit set on all but the last byte"""
+    if n < 0x80:
+        return BYTE_VALUES[n]
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def array_buffer(seq):
+    # type: (Any) -> Optional[Tuple[str, memoryview]]
+    """Return (format, memoryview) for the storage of an Array if it can be
+    sent as a buffer, where format is a byte order and struct format
+    character like "<d", or None if its elements have to be sent one by
+    one"""
+    if getattr(seq, "ndim", 1) != 1:
+        # The length prefix counts bytes of a flat buffer, and we don't send
+        # a shape
+        return None
+    dtype = getattr(seq, "dtype", None)
+    if dtype is not None:
+        fmt = SIZED_FORMATS.get((dtype.kind, dtype.itemsize), None)
+        if fmt is None:
+            return None
+        order = dtype.byteorder if dtype.byteorder in "<>" else NATIVE_ORDER
+        if not seq.flags.c_contiguous:
+            seq = seq.copy()
+        # Numpy arrays export their own format, so cast to bytes
+        return order + fmt, memoryview(seq.view("B"))
+    if isinstance(seq, (memoryview, array.array)) and CAN_CAST:
+        storage = seq  # type: Any
+        view = memoryview(storage)  # type: Any
+        fmt = SIZED_FORMATS.get(
+            (FORMAT_KINDS.get(view.format, ""), view.itemsize), None)
+        if fmt is None:
+            return None
+        return NATIVE_ORDER + fmt, view.cast("B")
+    return None
+
+
+def type_name(typ):
+    # type: (Any) -> str
+    """Return the name that an Array element type is sent as"""
+    if typ in BUILTIN_TYPES.values():
+        return typ.__name__
+    # A numpy scalar type like np.int32
+    return typ(0).dtype.name
+
+
+def array_from_buffer(name, fmt, buf):
+    # type: (str, str, Any) -> Array
+    """Make an Array of the type called name that wraps buf without copying
+    if possible"""
+    try:
+        import numpy as np
+    except ImportError:
+        has_numpy = False
+    else:
+        has_numpy = True
+    if not CAN_CAST and isinstance(buf, memoryview):
+        # Python2 numpy can't read from a memoryview
+        buf = buf.tobytes()
+    if has_numpy:
+        typ = BUILTIN_TYPES.get(name, None) or np.dtype(name).type
+        dtype = np.dtype(fmt)
+        seq = np.frombuffer(buf, dtype=dtype)  # type: Any
+        if not dtype.isnative:
+            # Sent from a machine with a different byte order
+            seq = seq.astype(dtype.newbyteorder("="))
+    else:
+        typ = BUILTIN_TYPES[name]
+        if fmt[0] == NATIVE_ORDER and CAN_CAST:
+            seq = typed_memoryview(typ, buf)
+        else:
+            seq = array.array(fmt[1], bytes(buf))
+            if fmt[0] != NATIVE_ORDER:
+                seq.byteswap()
+    return to_array(Array[typ], seq)  # type: ignore
+
+
+class BinaryCodec(object):
+    """A compact binary encoding of Serializable trees in the style of
+    MessagePack, for the lifetime of a connection
+
+    Small ints fit in a single byte, and lengths are varints. Serializables
+    are sent as an index into a table of typeids followed by their
+    call_types values, with no field names. Typeids not in the initial
+    table are sent with their schema of field names the first time, then
+    by index, so both ends of a connection need to use one codec for all
+    their messages in order. If the receiver's class has different fields
+    the values are passed to its from_dict() by name.
+    Arrays of numbers and bools are sent as raw buffers, either inline or
+    out of band like pickle protocol 5.
+
+    Args:
+        typeids: The initial typeid table, which both ends have to agree on
+        dict_cls: The class to decode dicts to
+    """
+
+    def __init__(self, typeids=(), dict_cls=FrozenOrderedDict):
+        # type: (Iterable[str], Type[dict]) -> None
+        self.dict_cls = dict_cls
+        self._encode_indexes = {}  # type: Dict[str, int]
+        self._decode_typeids = []  # type: List[str]
+        # {typeid index: field names sent with it}
+        self._decode_schemas = {}  # type: Dict[int, Tuple[str, ...]]
+        for typeid in typeids:
+            self._encode_indexes[typeid] = len(self._encode_indexes)
+            self._decode_typeids.append(typeid)
+
+    def encode(self, o, buffer_callback=None):
+        # type: (Any, Callable[[memoryview], Any]) -> bytes
+        """Encode o to bytes
+
+        Args:
+            o: The object to encode
+            buffer_callback: If given, called with a zero-copy memoryview of
+                the storage of each numeric Array in turn, rather than
+                including it in the returned bytes. The buffers have to be
+                passed in the same order to decode()
+        """
+        out = []  # type: List[Any]
+        write = out.append
+        indexes = self._encode_indexes
+        new_typeids = []  # type: List[str]
+
+        def write_bytes(s):
+            if not isinstance(s, bytes):
+                s = s.encode("utf-8")
+            write(pack_varint(len(s)))
+            write(s)
+
+        def write_str(tag, s):
+            write(BYTE_VALUES[tag])
+            write_bytes(s)
+
+        def encode(o):
+            cls = o.__class__
+            if o is None:
+                write(BYTE_VALUES[NONE])
+            elif cls is bool:
+                write(BYTE_VALUES[TRUE if o else FALSE])
+            elif cls is float:
+                write(BYTE_VALUES[FLOAT])
+                write(F64.pack(o))
+            elif cls is str or cls is type(u""):
+                write_str(STR, o)
+            elif cls is int or cls is type(2 ** 64):
+                if 0 <= o < FIXINT_END:
+                    write(BYTE_VALUES[o])
+                    return
+                for tag, lo, hi, pack in INT_LIMITS:
+                    if lo <= o < hi:
+                        write(BYTE_VALUES[tag])
+                        write(pack(o))
+                        return
+                write_str(BIGINT, str(o))
+            elif cls is bytes or cls is bytearray:
+                write_str(BYTES, bytes(o))
+            elif uses_default_method(cls, "to_dict") and o.typeid:
+                index = indexes.get(o.typeid, None)
+                keys = key_tuple(o.call_types)
+                if index is None:
+                    # Send the schema the first time we see the typeid
+                    index = indexes[o.typeid] = len(indexes)
+                    new_typeids.append(o.typeid)
+                    write_str(NEW_TYPEID, o.typeid)
+                    write(pack_varint(len(keys)))
+                    for k in keys:
+                        write_bytes(k)
+                write(BYTE_VALUES[OBJECT])
+                write(pack_varint(index))
+                write(pack_varint(len(keys)))
+                for k in keys:
+                    encode(getattr(o, k))
+            elif isinstance(o, dict):
+                write(BYTE_VALUES[DICT])
+                write(pack_varint(len(o)))
+                for k, v in o.items():
+                    encode(k)
+                    encode(v)
+            elif isinstance(o, Array):
+                encode_array(o)
+            elif isinstance(o, (list, tuple)):
+                encode_list(o)
+            elif isinstance(o, str_):
+                write_str(STR, o)
+            else:
+                serialized = serialize_object(o)
+                if serialized is o:
+                    raise TypeError("Can't encode %r" % (o,))
+                encode(serialized)
+
+        def encode_list(seq):
+            write(BYTE_VALUES[LIST])
+            write(pack_varint(len(seq)))
+            for x in seq:
+                encode(x)
+
+        def encode_array(o):
+            seq = o.seq
+            if isinstance(seq, SeqView):
+                seq = seq.materialize()
+            if not buffer_formats(o.typ):
+                encode_list(seq)
+                return
+            if isinstance(seq, list) and len(seq) >= PACK_LIST_MIN:
+                seq = compact_seq(o.typ, seq)
+            fmt_buf = array_buffer(seq)
+            if fmt_buf is None:
+                if getattr(seq, "ndim", 1) != 1:
+                    # Multi-dimensional, so send as nested lists
+                    seq = seq.tolist()
+                encode_list(seq)
+                return
+            fmt, buf = fmt_buf
+            if buffer_callback is None:
+                write_str(ARRAY, type_name(o.typ))
+                write_bytes(fmt)
+                write(pack_varint(len(buf)))
+                # Python2 can't join memoryviews
+                write(buf if CAN_CAST else buf.tobytes())
+            else:
+                write_str(ARRAY_OUT_OF_BAND, type_name(o.typ))
+                write_bytes(fmt)
+                buffer_callback(buf)
+
+        try:
+            encode(o)
+        except Exception:
+            # The other end won't see these typeids, so forget them
+            for typeid in new_typeids:
+                indexes.pop(typeid)
+            raise
+        return b"".join(out)
+
+    def decode(self, data, buffers=None):
+        # type: (Any, Iterable[Any]) -> Any
+        """Decode bytes made by encode(), constructing Serializables as they
+        are read. Numeric Arrays wrap the data or buffers without copying
+
+        Args:
+            data: The bytes, or anything else supporting the buffer protocol
+            buffers: The buffers passed to buffer_callback by encode(), in
+                the same order
+        """
+        view = memoryview(data)
+        if CAN_CAST:
+            byte_at = view.__getitem__  # type: Callable[[int], int]
+        else:
+            # Python2 memoryviews index to 1 character strings
+            byte_at = lambda pos: bytearray(view[pos:pos + 1])[0]
+        buffer_iter = iter(buffers or ())
+        typeids = self._decode_typeids
+        schemas = self._decode_schemas
+        dict_cls = self.dict_cls
+        lookup = Serializable._subcls_lookup
+        # {typeid index: function making an object from its args}
+        makers = {}  # type: Dict[int, Callable[[List], Any]]
+
+        def read_varint(pos):
+            b = byte_at(pos)
+            if b < 0x80:
+                return b, pos + 1
+            n = 0
+            shift = 0
+            while b >= 0x80:
+                n |= (b & 0x7f) << shift
+                shift += 7
+                pos += 1
+                b = byte_at(pos)
+            return n | (b << shift), pos + 1
+
+        def read_bytes(pos):
+            n, pos = read_varint(pos)
+            return view[pos:pos + n], pos + n
+
+        def read_str(pos):
+            s, pos = read_bytes(pos)
+            return s.tobytes().decode("utf-8"), pos
+
+        def decode(pos):
+            tag = byte_at(pos)
+            pos += 1
+            if tag < FIXINT_END:
+                return tag, pos
+            elif tag == NONE:
+                return None, pos
+            elif tag == FALSE:
+                return False, pos
+            elif tag == TRUE:
+                return True, pos
+            elif tag == FLOAT:
+                return F64.unpack_from(view, pos)[0], pos + 8
+            elif tag == STR:
+                return read_str(pos)
+            elif tag in INT_UNPACKS:
+                unpack_from, size = INT_UNPACKS[tag]
+                return unpack_from(view, pos)[0], pos + size
+            elif tag == BIGINT:
+                s, pos = read_str(pos)
+                return int(s), pos
+            elif tag == BYTES:
+                b, pos = read_bytes(pos)
+                return b.tobytes(), pos
+            elif tag == LIST:
+                n, pos = read_varint(pos)
+                return decode_n(n, pos)
+            elif tag == DICT:
+                n, pos = read_varint(pos)
+                pairs = []
+                for _ in range(n):
+                    k, pos = decode(pos)
+                    v, pos = decode(pos)
+                    pairs.append((k, v))
+                d = dict_cls(pairs)
+                if "typeid" in d:
+                    # A Serializable with its own to_dict
+                    d = Serializable.lookup_subclass(d).from_dict(d)
+                return d, pos
+            elif tag == NEW_TYPEID:
+                typeid, pos = read_str(pos)
+                n, pos = read_varint(pos)
+                names = []
+                for _ in range(n):
+                    name, pos = read_str(pos)
+                    names.append(name)
+                typeids.append(typeid)
+                schemas[len(typeids) - 1] = tuple(names)
+                return decode(pos)
+            elif tag == OBJECT:
+                index, pos = read_varint(pos)
+                n, pos = read_varint(pos)
+                args, pos = decode_n(n, pos)
+                try:
+                    make = makers[index]
+                except KeyError:
+                    make = makers[index] = object_maker(index)
+                return make(args), pos
+            elif tag == ARRAY or tag == ARRAY_OUT_OF_BAND:
+                name, pos = read_str(pos)
+                fmt, pos = read_str(pos)
+                if tag == ARRAY:
+                    buf, pos = read_bytes(pos)
+                else:
+                    try:
+                        buf = next(buffer_iter)
+                    except StopIteration:
+                        raise ValueError("Not enough out of band buffers")
+                return array_from_buffer(name, str(fmt), buf), pos
+            else:
+                raise ValueError("Bad tag %d at position %d" % (tag, pos - 1))
+
+        def decode_n(n, pos):
+            # Decode n values into a list, inlining small ints as they are
+            # the most common
+            items = []
+            append = items.append
+            for _ in range(n):
+                tag = byte_at(pos)
+                if tag < FIXINT_END:
+                    append(tag)
+                    pos += 1
+                else:
+                    item, pos = decode(pos)
+                    append(item)
+            return items, pos
+
+        def object_maker(index):
+            # Return a function that makes an object of the typeid at index
+            # from its args
+            if index >= len(typeids):
+                raise ValueError(
+                    "Typeid %d not in table, messages decoded out of order"
+                    % index)
+            typeid = typeids[index]
+            cls = lookup.get(typeid, None)
+            if cls is None:
+                raise TypeError("'%s' not a valid typeid" % typeid)
+            # Field names as sent, or our own if in the initial table
+            names = schemas.get(index, key_tuple(cls.call_types))
+            return make_object_maker(typeid, names, dict_cls)
+
+        o, pos = decode(0)
+        if pos != len(view):
+            raise ValueError("%d bytes left over after decoding" % (
+                len(view) - pos))
+        return o
+
+
+def binary_encode(o, buffer_callback=None):
+    # type: (Any, Callable[[memoryview], Any]) -> bytes
+    """Encode o in a single self-contained message with BinaryCodec.encode()
+    """
+    return BinaryCodec().encode(o, buffer_callback)
+
+
+def binary_decode(data, buffers=None, dict_cls=FrozenOrderedDict):
+    # type: (Any, Iterable[Any], Type[dict]) -> Any
+    """Decode a message made by binary_encode()"""
+    return BinaryCodec(dict_cls=dict_cls).decode(data, buffers)
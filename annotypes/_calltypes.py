@@ -1,28 +1,76 @@
+import ast
 import inspect
-import re
-import tokenize
-from collections import OrderedDict
 
 from ._anno import Anno, NO_DEFAULT, make_repr, anno_with_default
-from ._compat import add_metaclass, getargspec, func_globals
+from ._comment_cache import cached_comment_strings
+from ._compat import add_metaclass, getargspec, func_globals, str_
+from ._frozen_dict import FrozenOrderedDict, key_tuple
+from ._type_comments import parse_type_comment
 from ._typing import TYPE_CHECKING, GenericMeta, Any
 
 if TYPE_CHECKING:  # pragma: no cover
-    from typing import Dict, Callable, Tuple, List
+    from typing import Dict, Callable, Tuple, List, Optional
 
-type_re = re.compile('^# type: ([^-]*)( -> (.*))?$')
+
+class LazyClassAttribute(object):
+    """Class attribute that calls make(cls) on first access, then replaces
+    itself on the class with the result"""
+
+    def __init__(self, name, make):
+        # type: (str, Callable[[Any], Any]) -> None
+        self.name = name
+        self.make = make
+
+    def __get__(self, inst, owner):
+        value = self.make(owner)
+        setattr(owner, self.name, value)
+        return value
+
+
+# Shared by all the classes that take no arguments
+EMPTY_CALL_TYPES = FrozenOrderedDict()
+
+
+def make_class_call_types(cls):
+    # type: (Any) -> Dict[str, Anno]
+    f = cls.__dict__.get('__init__', None)
+    if f:
+        call_types, _ = make_call_types(f, func_globals(f))
+        return call_types
+    # Share call_types with the first base in the MRO that has them
+    for base in cls.__mro__[1:]:
+        if "call_types" in base.__dict__:
+            call_types = getattr(base, "call_types")
+            if isinstance(call_types, FrozenOrderedDict):
+                return call_types
+            elif call_types is not None:
+                return FrozenOrderedDict(call_types.items())
+            break
+    return EMPTY_CALL_TYPES
+
+
+def make_class_return_type(cls):
+    # type: (Any) -> Anno
+    return Anno("Class instance", name="Instance").set_typ(cls)
 
 
 class CallTypesMeta(GenericMeta):
     def __init__(cls, name, bases, dct, **kwargs):
-        f = dct.get('__init__', None)
-        if f:
-            cls.call_types, _ = make_call_types(f, func_globals(f))
-        elif getattr(cls, "call_types", None) is not None:
-            cls.call_types = OrderedDict(cls.call_types)
-        else:
-            cls.call_types = OrderedDict()
-        cls.return_type = Anno("Class instance", name="Instance").set_typ(cls)
+        # Make call_types and return_type on first access, so classes that
+        # are never introspected don't pay for it, and annotations can
+        # refer to names defined after the class
+        body_call_types = dct.get("call_types", None)
+        # add_metaclass passes our own LazyClassAttribute back in dct
+        if body_call_types is None or "__init__" in dct or isinstance(
+                body_call_types, LazyClassAttribute):
+            cls.call_types = LazyClassAttribute(
+                "call_types", make_class_call_types)
+        elif not isinstance(body_call_types, FrozenOrderedDict):
+            # Keep call_types defined in the class body, made immutable so
+            # subclasses can share them
+            cls.call_types = FrozenOrderedDict(body_call_types.items())
+        cls.return_type = LazyClassAttribute(
+            "return_type", make_class_return_type)
         super(CallTypesMeta, cls).__init__(name, bases, dct, **kwargs)
 
     def matches_type(self, cls):
@@ -38,7 +86,7 @@ class WithCallTypes(object):
     return_type = None  # type: Anno
 
     def __repr__(self):
-        repr_str = make_repr(self, self.call_types)
+        repr_str = make_repr(self, key_tuple(self.call_types))
         return repr_str
 
 
@@ -69,13 +117,23 @@ def make_call_types(f, globals_d):
         annotations = make_annotations(f, globals_d)
     else:
         annotations = f.__annotations__
+        if any(isinstance(v, str_) for v in annotations.values()):
+            # PEP 563 string annotations, so evaluate them now
+            annotations = dict(annotations)
+            for k, v in annotations.items():
+                if isinstance(v, str_):
+                    try:
+                        annotations[k] = eval(v, globals_d)
+                    except Exception as e:
+                        raise ValueError("Error evaluating %r: %s" % (v, e))
 
-    call_types = OrderedDict()  # type: Dict[str, Anno]
+    items = []
     for a in args:
         anno = anno_with_default(annotations[a], defaults.get(a, NO_DEFAULT))
         assert isinstance(anno, Anno), \
             "Argument %r has type %r which is not an Anno" % (a, anno)
-        call_types[a] = anno
+        items.append((a, anno))
+    call_types = FrozenOrderedDict(items)  # type: Dict[str, Anno]
 
     return_type = anno_with_default(annotations.get("return", None))
     if return_type is Any:
@@ -86,99 +144,69 @@ def make_call_types(f, globals_d):
     return call_types, return_type
 
 
-class EchoStr(str):
-    def __getitem__(self, item):
-        if isinstance(item, tuple):
-            # obj["x", "y"] is obj.__getitem__(("x", "y"))
-            str_items = []
-            for x in item:
-                if x is Ellipsis:
-                    str_items.append("...")
-                else:
-                    str_items.append(str(x))
-            item = ", ".join(str_items)
-        return "%s[%s]" % (self, item)
-
-    def __getattr__(self, item):
-        return "%s.%s" % (self, item)
-
-
-class EchoDict(dict):
-    # A fake globals dictionary that just returns the string back
-    def __getitem__(self, item):
-        return EchoStr(item)
-
-
 def make_annotations(f, globals_d=None):
     # type: (Callable, Dict) -> Dict[str, Any]
     """Create an annotations dictionary from Python2 type comments
 
     http://mypy.readthedocs.io/en/latest/python2.html
 
+    The type comments of the whole module are parsed at once, and the strings
+    are cached in __pycache__ next to the source file, so they are only
+    parsed again when the source changes
+
     Args:
         f: The function to examine for type comments
         globals_d: The globals dictionary to get type idents from. If not
             specified then make the annotations dict contain strings rather
             than the looked up objects
     """
-    locals_d = {}  # type: Dict[str, Any]
-    if globals_d is None:
-        # If not given a globals_d then we should just populate annotations with
-        # the strings in the type comment.
-        globals_d = {}
-        # The current approach is to use eval, which means manufacturing a
-        # dict like object that will just echo the string back to you. This
-        # has a number of complexities for somthing like numpy.number or
-        # Callable[..., int], which are handled in EchoStr above, so it might be
-        # better off as an ast.parse in the future...
-        locals_d = EchoDict()
-    lines, _ = inspect.getsourcelines(f)
+    comment = cached_comment_strings(f, parse_type_comment)
+    if comment is None:
+        return {}
+    arg_types, return_type = comment
     arg_spec = getargspec(f)
     args = list(arg_spec.args)
     if arg_spec.varargs is not None:
         args.append(arg_spec.varargs)
     if arg_spec.keywords is not None:
         args.append(arg_spec.keywords)
-    it = iter(lines)
-    types = []  # type: List
-    found = None
-    for token in tokenize.generate_tokens(lambda: next(it)):
-        typ, string, start, end, line = token
-        if typ == tokenize.COMMENT:
-            found = type_re.match(string)
-            if found:
-                parts = found.groups()
-                # (...) is used to represent all the args so far
-                if parts[0] != "(...)":
-                    expr = parts[0].replace("*", "")
-                    try:
-                        ob = eval(expr, globals_d, locals_d)
-                    except Exception as e:
-                        raise ValueError(
-                            "Error evaluating %r: %s" % (expr, e))
-                    if isinstance(ob, tuple):
-                        # We got more than one argument
-                        types += list(ob)
-                    else:
-                        # We got a single argument
-                        types.append(ob)
-                if parts[1]:
-                    # Got a return, done
-                    try:
-                        ob = eval(parts[2], globals_d, locals_d)
-                    except Exception as e:
-                        raise ValueError(
-                            "Error evaluating %r: %s" % (parts[2], e))
-                    if args and args[0] in ["self", "cls"]:
-                        # Allow the first argument to be inferred
-                        if len(args) == len(types) + 1:
-                            args = args[1:]
-                    assert len(args) == len(types), \
-                        "Args %r Types %r length mismatch" % (args, types)
-                    ret = dict(zip(args, types))
-                    ret["return"] = ob
-                    return ret
-    if found:
-        # If we have ever found a type comment, but not the return value, error
-        raise ValueError("Got to the end of the function without seeing ->")
-    return {}
+    if globals_d is None:
+        # Populate annotations with the strings in the type comment
+        types = [type_string(x) for x in arg_types]  # type: List
+        ob = type_string(return_type)
+    else:
+        # Evaluate all the args at once
+        expr = "(%s)" % ", ".join(arg_types)
+        try:
+            evaluated = eval(expr, globals_d)
+        except Exception as e:
+            raise ValueError("Error evaluating %r: %s" % (expr, e))
+        if len(arg_types) == 1:
+            types = [evaluated]
+        else:
+            types = list(evaluated)
+        try:
+            ob = eval(return_type, globals_d)
+        except Exception as e:
+            raise ValueError("Error evaluating %r: %s" % (return_type, e))
+    if args and args[0] in ["self", "cls"]:
+        # Allow the first argument to be inferred
+        if len(args) == len(types) + 1:
+            args = args[1:]
+    assert len(args) == len(types), \
+        "Args %r Types %r length mismatch" % (args, types)
+    ret = dict(zip(args, types))
+    ret["return"] = ob
+    return ret
+
+
+def type_string(expr):
+    # type: (str) -> Optional[str]
+    """Return the string that a type comment expression stands for"""
+    if expr == "None":
+        return None
+    elif expr[:1] in ("'", '"'):
+        # A forward reference
+        return ast.literal_eval(expr)
+    else:
+        return expr
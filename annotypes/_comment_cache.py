@@ -0,0 +1,145 @@
+import atexit
+import json
+import os
+import sys
+
+from ._typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Dict, Callable, Any, Optional, List
+
+# Marks a function we have parsed but haven't got in the cache
+MISSING = object()
+
+# Bump this when the format of the entries, or how they are parsed, changes
+CACHE_VERSION = 3
+
+
+def source_stamp(source_path):
+    # type: (str) -> List
+    """Return [mtime, size] of a source file, which changes when it is
+    edited"""
+    st = os.stat(source_path)
+    return [st.st_mtime, st.st_size]
+
+
+def bytecode_dir(source_path):
+    # type: (str) -> str
+    """Return the directory Python writes the bytecode of a source file to,
+    __pycache__ next to it, or a mirror of its path under sys.pycache_prefix
+    if that is set"""
+    if sys.version_info < (3,):
+        return os.path.join(os.path.dirname(source_path), "__pycache__")
+    from importlib.util import cache_from_source
+    return os.path.dirname(cache_from_source(source_path))
+
+
+class CommentCache(object):
+    """The type comment strings of the functions in a single source file,
+    persisted in <module>.annotypes.json next to its bytecode in __pycache__.
+    Like bytecode, it isn't written if sys.dont_write_bytecode is set
+
+    Entries are only valid while the source file has the same stamp (mtime and
+    size), so editing the source invalidates them
+    """
+
+    def __init__(self, source_path):
+        # type: (str) -> None
+        filename = os.path.basename(source_path)
+        self.path = os.path.join(
+            bytecode_dir(source_path),
+            os.path.splitext(filename)[0] + ".annotypes.json")
+        self.stamp = source_stamp(source_path)
+        self.entries = {}  # type: Dict[str, Any]
+        self.dirty = False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            # Not written yet, unreadable or corrupt
+            pass
+        else:
+            if isinstance(data, dict) and data.get("stamp") == self.stamp \
+                    and data.get("version") == CACHE_VERSION:
+                self.entries = data.get("entries", {})
+
+    def write(self):
+        # type: () -> None
+        """Atomically write our entries if we have added any"""
+        if not self.dirty or sys.dont_write_bytecode:
+            return
+        self.dirty = False
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp_path, "w") as f:
+                json.dump(dict(version=CACHE_VERSION, stamp=self.stamp,
+                               entries=self.entries), f)
+            getattr(os, "replace", os.rename)(tmp_path, self.path)
+        except (IOError, OSError):
+            # Read-only or racing with another process, not fatal as the cache
+            # is only an optimization
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# {source_path: CommentCache}
+_caches = {}  # type: Dict[str, Optional[CommentCache]]
+
+
+def write_caches():
+    # type: () -> None
+    """Write any new entries of the comment caches to disk"""
+    for cache in _caches.values():
+        if cache:
+            cache.write()
+
+
+atexit.register(write_caches)
+
+
+def _cache_for(source_path):
+    # type: (str) -> Optional[CommentCache]
+    cache = _caches.get(source_path, MISSING)  # type: Any
+    if cache is None:
+        # Not a real file, like code made by exec
+        return None
+    elif cache is not MISSING:
+        # The source may have been edited and reloaded since we read it
+        try:
+            if source_stamp(source_path) == cache.stamp:
+                return cache
+        except OSError:
+            # Deleted, so drop the cache below
+            pass
+    try:
+        cache = CommentCache(source_path)
+    except OSError:
+        cache = None
+    _caches[source_path] = cache
+    return cache
+
+
+def cached_comment_strings(f, parse):
+    # type: (Callable, Callable[[Callable], Any]) -> Any
+    """Return parse(f), a JSON serializable value that depends only on the
+    source of f, from the comment cache of its source file if possible
+
+    Args:
+        f: The function whose type comments should be parsed
+        parse: The function that reads the source of f and returns the type
+            comment strings
+    """
+    code = getattr(f, "__code__", None)
+    cache = code and _cache_for(code.co_filename)
+    if cache is None:
+        return parse(f)
+    key = "%s:%d" % (
+        getattr(f, "__qualname__", f.__name__), code.co_firstlineno)
+    value = cache.entries.get(key, MISSING)
+    if value is MISSING:
+        value = parse(f)
+        cache.entries[key] = value
+        cache.dirty = True
+    return value
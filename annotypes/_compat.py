@@ -32,6 +32,10 @@ def func_globals(f):
 if sys.version_info < (3,):
     # python 2
     str_ = basestring
+    intern_ = intern
+    from itertools import izip as zip_
 else:
     # python 3
-    str_ = str
\ No newline at end of file
+    str_ = str
+    intern_ = sys.intern
+    zip_ = zip
\ No newline at end of file
@@ -2,6 +2,15 @@ def not_supported(self, *args, **kwargs):
     raise TypeError("FrozenOrderedDict is immutable")
 
 
+def key_tuple(d):
+    """Return the keys of a dict as a tuple, without making a new one if it
+    is a FrozenOrderedDict"""
+    keys = getattr(d, "_keys", None)
+    if keys is None:
+        keys = tuple(d)
+    return keys
+
+
 class FrozenOrderedDict(dict):
     """Absolutely minimal implementation of an OrderedDict, frozen at init to
     give better performance than the one in collections"""
@@ -13,13 +22,13 @@ class FrozenOrderedDict(dict):
         for k, v in seq:
             setitem(k, v)
             append(k)
-        self._keys = keys
+        self._keys = tuple(keys)
 
     __setitem__ = not_supported
     __delitem__ = not_supported
 
     def __iter__(self):
-        return (k for k in self._keys)
+        return iter(self._keys)
 
     clear = not_supported
     copy = not_supported
@@ -36,7 +45,7 @@ class FrozenOrderedDict(dict):
         return (self[k] for k in self._keys)
 
     def keys(self):
-        return self._keys
+        return list(self._keys)
 
     pop = not_supported
     popitem = not_supported
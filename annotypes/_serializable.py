@@ -1,10 +1,12 @@
+import base64
 import inspect
 import json
 
-from ._array import Array
+from ._array import Array, SeqView, to_array, buffer_formats
+from ._compat import str_, getargspec
 from ._calltypes import WithCallTypes
 from ._typing import TypeVar, TYPE_CHECKING
-from ._frozen_dict import FrozenOrderedDict
+from ._frozen_dict import FrozenOrderedDict, key_tuple
 
 try:
     from enum import Enum
@@ -14,7 +16,9 @@ else:
     has_enum = True
 
 if TYPE_CHECKING:
-    from typing import Type, Dict, Any, Union, List, Tuple
+    from typing import Type, Dict, Any, Union, List, Tuple, Callable, \
+        Optional, Iterator
+    from ._anno import Anno
 
 
 def stringify_error(e):
@@ -27,6 +31,307 @@ def json_encode(o, indent=None):
     return s
 
 
+# Number of elements of a list or Array that json_iterencode encodes at once
+ENCODE_CHUNK = 4096
+
+# Number of characters that json_encode_to buffers before writing
+WRITE_BUFFER = 65536
+
+
+def json_iterencode(o):
+    # type: (Any) -> Iterator[str]
+    """Encode o to JSON like json_encode(), but yield it in chunks, walking
+    Serializables, dicts, lists and Arrays incrementally rather than
+    serializing the whole tree first"""
+    encode = json.JSONEncoder(default=serialize_object).encode
+
+    def iterencode(o):
+        cls = o.__class__
+        if cls in LEAF_TYPES:
+            yield encode(o)
+            return
+        if uses_default_method(cls, "to_dict"):
+            if o.typeid:
+                keys = ("typeid",) + key_tuple(o.call_types)
+            else:
+                keys = key_tuple(o.call_types)
+            pairs = ((k, getattr(o, k)) for k in keys)  # type: Any
+        elif isinstance(o, dict):
+            pairs = o.items()
+        else:
+            if isinstance(o, Array):
+                seq = o.seq
+                if hasattr(seq, "dtype") and \
+                        find_serializer(seq.__class__) is not serialize_tolist:
+                    # A serializer is registered for numpy arrays
+                    for chunk in iterencode(serialize_object(seq)):
+                        yield chunk
+                    return
+                recurse = not inspect.isclass(o.typ) or \
+                    find_serializer(o.typ) is not None
+            elif isinstance(o, (list, tuple)):
+                seq = o
+                recurse = True
+            else:
+                serialized = serialize_object(o)
+                if serialized is o:
+                    yield encode(o)
+                else:
+                    for chunk in iterencode(serialized):
+                        yield chunk
+                return
+            yield "["
+            for start in range(0, len(seq), ENCODE_CHUNK):
+                items = seq[start:start + ENCODE_CHUNK]
+                if isinstance(items, SeqView):
+                    items = items.materialize()
+                if hasattr(items, "tolist"):
+                    items = items.tolist()
+                if start:
+                    yield ", "
+                if recurse and not all(x.__class__ in LEAF_TYPES
+                                       for x in items):
+                    for i, x in enumerate(items):
+                        if i:
+                            yield ", "
+                        for chunk in iterencode(x):
+                            yield chunk
+                elif items:
+                    # Strip the brackets so chunks join into one list
+                    yield encode(list(items))[1:-1]
+            yield "]"
+            return
+        yield "{"
+        for i, (k, v) in enumerate(pairs):
+            if isinstance(k, str_):
+                key = encode(k)
+            else:
+                # Let json make keys like 1, True or None into strings, or
+                # raise TypeError for keys like tuples, exactly as it would
+                # in json_encode(). Strip the {} and ": 0"
+                key = encode({k: 0})[1:-4]
+            yield "%s%s: " % (", " if i else "", key)
+            for chunk in iterencode(v):
+                yield chunk
+        yield "}"
+
+    return iterencode(o)
+
+
+def json_encode_to(fp, o):
+    # type: (Any, Any) -> None
+    """Encode o to JSON like json_encode(), writing it to a file-like object
+    or socket in bounded chunks, so peak memory doesn't depend on the size
+    of the output
+
+    Args:
+        fp: Object with a write(str) method, or a socket with sendall(bytes)
+        o: The object to encode
+    """
+    write = getattr(fp, "write", None)
+    if write is None:
+        sendall = fp.sendall
+        write = lambda s: sendall(s.encode("utf-8"))
+    buffer = []  # type: List[str]
+    size = 0
+    for chunk in json_iterencode(o):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BUFFER:
+            write("".join(buffer))
+            buffer = []
+            size = 0
+    if buffer:
+        write("".join(buffer))
+
+
+def make_object_pairs_hook(dict_cls=FrozenOrderedDict):
+    # type: (Type[dict]) -> Callable[[List[Tuple[str, Any]]], Any]
+    """Make an object_pairs_hook for json.loads that constructs registered
+    Serializable subclasses from objects with a typeid, numpy arrays from
+    the output of serialize_ndarray_base64(), and dict_cls from the rest"""
+    lookup = Serializable._subcls_lookup
+
+    def object_pairs_hook(pairs):
+        if pairs and pairs[0][0] == "typeid":
+            typeid = pairs[0][1]
+            values = pairs[1:]
+        elif pairs and pairs[0][0] == NDARRAY_KEY:
+            return deserialize_ndarray(dict(pairs))
+        else:
+            typeid = dict(pairs).get("typeid", None)
+            if typeid is None:
+                return dict_cls(pairs)
+            values = [(k, v) for k, v in pairs if k != "typeid"]
+        cls = lookup.get(typeid, None)
+        if cls is None:
+            raise TypeError("'%s' not a valid typeid" % typeid)
+        # Objects are encoded in call_types order, which is usually the order
+        # __init__ takes them, so if the keys match that we can pass the
+        # values positionally without making a dict
+        keys, args = tuple(zip(*values)) or ((), ())
+        if keys == init_arg_order(cls) and \
+                uses_default_method(cls, "from_dict"):
+            try:
+                return cls(*args)
+            except TypeError as e:
+                raise TypeError("%s raised error: %s" % (typeid, str(e)))
+        return cls.from_dict(dict_cls(pairs))
+
+    return object_pairs_hook
+
+
+def json_decode_object(s, type_check=None):
+    # type: (str, Union[Type[T], Tuple[Type[T], ...]]) -> T
+    """Decode JSON in a single pass, constructing registered Serializable
+    subclasses for objects with a typeid as they are parsed, rather than
+    decoding to dicts and calling deserialize_object afterwards
+
+    Args:
+        s: The JSON string to decode
+        type_check: If given, assert the result is an instance of this
+    """
+    ob = json.loads(s, object_pairs_hook=_object_pairs_hook)
+    if type_check is not None:
+        assert isinstance(ob, type_check), \
+            "Expected %s, got %r" % (type_check, type(ob))
+    return ob
+
+
+def make_object_maker(typeid, names, dict_cls=FrozenOrderedDict):
+    # type: (str, Tuple[str, ...], Type[dict]) -> Callable[[List], Any]
+    """Make a function that constructs the Serializable registered as typeid
+    from a list of the values of the fields called names. If these are its
+    call_types in the order its __init__ takes them then the values are
+    passed positionally, otherwise they go to its from_dict() by name"""
+    cls = Serializable._subcls_lookup.get(typeid, None)  # type: Any
+    if cls is None:
+        raise TypeError("'%s' not a valid typeid" % typeid)
+    positional = names == init_arg_order(cls) and \
+        uses_default_method(cls, "from_dict")
+
+    def make(args):
+        if len(args) != len(names):
+            raise ValueError("%s has %d fields, got %d" % (
+                typeid, len(names), len(args)))
+        if positional:
+            try:
+                return cls(*args)
+            except TypeError as e:
+                raise TypeError("%s raised error: %s" % (typeid, str(e)))
+        return cls.from_dict(dict_cls(zip(names, args)))
+
+    return make
+
+
+# The first key of the dicts that JSONCodec sends Serializables as
+POSITIONAL_KEY = "#"
+
+
+class JSONCodec(object):
+    """A JSON encoding of Serializable trees for the lifetime of a
+    connection, sending the schema of each typeid once, then its instances
+    as positional lists without field names
+
+    The first instance of each typeid is sent as
+    {"#": [index, value, ...], "typeid": typeid, "fields": [name, ...]},
+    and later ones as {"#": [index, value, ...]}, so both ends of a
+    connection need to use one codec for all their messages in order. Dicts
+    with "#" as their first key can't be sent.
+
+    Args:
+        dict_cls: The class to decode dicts to
+    """
+
+    def __init__(self, dict_cls=FrozenOrderedDict):
+        # type: (Type[dict]) -> None
+        self.dict_cls = dict_cls
+        self._encode_indexes = {}  # type: Dict[str, int]
+        # [function making an object from its args] for each typeid index
+        self._decode_makers = []  # type: List[Callable[[List], Any]]
+        self._object_pairs_hook = make_object_pairs_hook(dict_cls)
+
+    def encode(self, o):
+        # type: (Any) -> str
+        """Encode o to JSON, sending the schema of any typeids it contains
+        that haven't been sent before"""
+        indexes = self._encode_indexes
+        new_typeids = []  # type: List[str]
+
+        def convert(o):
+            cls = o.__class__
+            if cls in LEAF_TYPES:
+                return o
+            elif uses_default_method(cls, "to_dict") and o.typeid:
+                keys = key_tuple(o.call_types)
+                # Convert children first, so if this is the first instance
+                # of its typeid it gets the schema, as the decoder sees it
+                # after its children
+                values = [convert(getattr(o, k)) for k in keys]
+                index = indexes.get(o.typeid, None)
+                if index is None:
+                    index = indexes[o.typeid] = len(indexes)
+                    new_typeids.append(o.typeid)
+                    return FrozenOrderedDict([
+                        (POSITIONAL_KEY, [index] + values),
+                        ("typeid", o.typeid),
+                        ("fields", list(keys))])
+                return {POSITIONAL_KEY: [index] + values}
+            elif isinstance(o, dict):
+                if o and next(iter(o)) == POSITIONAL_KEY:
+                    raise ValueError(
+                        "Can't send a dict with first key %r" % POSITIONAL_KEY)
+                return FrozenOrderedDict(
+                    (k, convert(v)) for k, v in o.items())
+            elif isinstance(o, (list, tuple)):
+                return [convert(x) for x in o]
+            elif isinstance(o, Array) and (
+                    not inspect.isclass(o.typ) or
+                    find_serializer(o.typ) is not None):
+                seq = o.seq
+                if isinstance(seq, SeqView):
+                    seq = seq.materialize()
+                return [convert(x) for x in seq]
+            serialized = serialize_object(o)
+            if serialized is o:
+                return o
+            return convert(serialized)
+
+        try:
+            return json.dumps(convert(o))
+        except Exception:
+            # The other end won't see these typeids, so forget them
+            for typeid in new_typeids:
+                indexes.pop(typeid)
+            raise
+
+    def decode(self, s):
+        # type: (str) -> Any
+        """Decode JSON made by encode(), constructing Serializables as they
+        are parsed"""
+        makers = self._decode_makers
+        dict_cls = self.dict_cls
+        object_pairs_hook = self._object_pairs_hook
+
+        def hook(pairs):
+            if not pairs or pairs[0][0] != POSITIONAL_KEY:
+                return object_pairs_hook(pairs)
+            args = pairs[0][1]
+            index = args.pop(0)
+            if index == len(makers) and len(pairs) == 3:
+                # The first instance of a typeid, with its schema
+                schema = dict(pairs[1:])
+                makers.append(make_object_maker(
+                    schema["typeid"], tuple(schema["fields"]), dict_cls))
+            elif index >= len(makers):
+                raise ValueError(
+                    "Typeid %d not in table, messages decoded out of order"
+                    % index)
+            return makers[index](args)
+
+        return json.loads(s, object_pairs_hook=hook)
+
+
 def json_decode(s, dict_cls=FrozenOrderedDict):
     try:
         o = json.loads(s, object_pairs_hook=dict_cls)
@@ -36,54 +341,275 @@ def json_decode(s, dict_cls=FrozenOrderedDict):
         raise ValueError("Error decoding JSON object (%s)" % str(e))
 
 
-def serialize_object(o, dict_cls=FrozenOrderedDict):
+# {type: serializer(o, dict_cls)} registered with register_serializer()
+_registered_serializers = \
+    {}  # type: Dict[type, Callable[[Any, Type[dict]], Any]]
+
+# {type: serializer(o, dict_cls)} for each concrete type seen, where a
+# serializer of None means return the object unchanged
+_serializer_cache = {}  # type: Dict[type, Optional[Callable]]
+
+
+def register_serializer(typ):
+    # type: (type) -> Callable[[Callable[[Any, Type[dict]], Any]], Callable]
+    """Register a function to serialize instances of typ and its subclasses
+    in serialize_object(), taking precedence over the default behaviour.
+    For example:
+
+    >>> @register_serializer(datetime.datetime)
+    ... def serialize_datetime(o, dict_cls):
+    ...     return o.isoformat()
+
+    Args:
+        typ: The type to serialize. The function will be called with the
+            object to serialize, and the dict_cls to pass to serialize_object
+            if it needs to recurse
+    """
+    def decorator(serializer):
+        _registered_serializers[typ] = serializer
+        _serializer_cache.clear()
+        return serializer
+    return decorator
+
+
+def serialize_to_dict(o, dict_cls):
     # type: (Any, Type[dict]) -> Any
-    # Is it a Serializable?
-    to_dict = getattr(o, "to_dict", None)
-    if to_dict is not None:
-        return to_dict(dict_cls)
-
-    # Is it a dict?
-    if isinstance(o, dict):
-        # Need to recurse down in case we have a serializable object in the
-        # dict or somewhere further down the tree
-        return dict_cls((k, serialize_object(v, dict_cls))
-                        for k, v in o.items())
-
-    # Is it an Array, list or numpy array?
-    if o.__class__ is Array:
-        # If we wrapped list, this will tell it what might be in it
-        list_cls = o.typ
-        # Unwrap the array as it might be a list, tuple or numpy array
-        o = o.seq
-    else:
-        # Don't know what would be in a list, so give it something that will
-        # require it to recurse
-        list_cls = Serializable
-    if isinstance(o, list):
-        if inspect.isclass(list_cls) and (
-            hasattr(list_cls, "to_dict") or
-            isinstance(list_cls, Exception) or (
-                has_enum and isinstance(list_cls, Enum))):
-            recurse = True
-        else:
-            recurse = False
-        if recurse:
-            return [serialize_object(x) for x in o]
+    return o.to_dict(dict_cls)
+
+
+def serialize_dict(o, dict_cls):
+    # type: (Dict, Type[dict]) -> Any
+    # Need to recurse down in case we have a serializable object in the
+    # dict or somewhere further down the tree
+    return dict_cls((k, serialize_object(v, dict_cls)) for k, v in o.items())
+
+
+def serialize_list(o, dict_cls):
+    # type: (List, Type[dict]) -> Any
+    # Don't know what would be in a list, so recurse
+    return [serialize_object(x) for x in o]
+
+
+def serialize_array(o, dict_cls):
+    # type: (Array, Type[dict]) -> Any
+    # Unwrap the array as it might be a list, tuple or numpy array
+    seq = o.seq  # type: Any
+    if isinstance(seq, SeqView):
+        # A slice of another Array, so copy out the elements
+        seq = seq.materialize()
+    if isinstance(seq, list):
+        # Only recurse if elements of our typ need serializing
+        if not inspect.isclass(o.typ) or find_serializer(o.typ) is not None:
+            return [serialize_object(x) for x in seq]
         else:
-            return o
-    elif hasattr(o, "tolist"):
-        # Numpy bools, numbers and arrays all have a tolist function
-        return o.tolist()
-    elif isinstance(o, Exception):
-        # Exceptions should be stringified
-        return stringify_error(o)
-    elif has_enum and isinstance(o, Enum):
-        # Return value of enums
-        return o.value
+            return seq
+    elif hasattr(seq, "tolist"):
+        # Numpy arrays and typed buffers all have a tolist function, but go
+        # through serialize_object in case a serializer is registered
+        return serialize_object(seq, dict_cls)
+    else:
+        return seq
+
+
+def serialize_tolist(o, dict_cls):
+    # type: (Any, Type[dict]) -> Any
+    # Numpy bools, numbers and arrays all have a tolist function
+    return o.tolist()
+
+
+# The key of the base64 data in the dict made by serialize_ndarray_base64()
+NDARRAY_KEY = "__ndarray__"
+
+
+def serialize_ndarray_base64(o, dict_cls):
+    # type: (Any, Type[dict]) -> Any
+    """Serialize a numpy array as a dict of its base64 encoded data, dtype
+    and shape, rather than a list of Python numbers. This is opt-in, as the
+    receiver needs to decode it with json_decode_object(),
+    deserialize_typed() or deserialize_ndarray():
+
+    >>> register_serializer(np.ndarray)(serialize_ndarray_base64)
+    """
+    if o.dtype.hasobject:
+        # Can't send pointers, so send the objects
+        return [serialize_object(x, dict_cls) for x in o.tolist()]
+    return dict_cls([
+        (NDARRAY_KEY, base64.b64encode(o.tobytes()).decode("ascii")),
+        ("dtype", o.dtype.str),
+        ("shape", list(o.shape))])
+
+
+def deserialize_ndarray(d):
+    # type: (Dict[str, Any]) -> Any
+    """Make a numpy array from the output of serialize_ndarray_base64()
+    without any per-element work. The array is read-only as it shares the
+    memory of the decoded data"""
+    import numpy as np
+    dtype = np.dtype(str(d["dtype"]))
+    data = base64.b64decode(d[NDARRAY_KEY])
+    arr = np.frombuffer(data, dtype=dtype).reshape(d["shape"])
+    if not dtype.isnative:
+        # Sent from a machine with a different byte order
+        arr = arr.astype(dtype.newbyteorder("="))
+    return arr
+
+
+def serialize_exception(o, dict_cls):
+    # type: (Exception, Type[dict]) -> Any
+    # Exceptions should be stringified
+    return stringify_error(o)
+
+
+def serialize_enum(o, dict_cls):
+    # type: (Any, Type[dict]) -> Any
+    # Return value of enums
+    return o.value
+
+
+def find_serializer(cls):
+    # type: (type) -> Optional[Callable[[Any, Type[dict]], Any]]
+    """Return the serializer for instances of cls, or None if they should be
+    returned unchanged"""
+    try:
+        return _serializer_cache[cls]
+    except KeyError:
+        pass
+    serializer = None  # type: Optional[Callable[[Any, Type[dict]], Any]]
+    for base in inspect.getmro(cls):
+        if base in _registered_serializers:
+            serializer = _registered_serializers[base]
+            break
     else:
+        if hasattr(cls, "to_dict"):
+            serializer = serialize_to_dict
+        elif issubclass(cls, dict):
+            serializer = serialize_dict
+        elif issubclass(cls, Array):
+            serializer = serialize_array
+        elif issubclass(cls, list):
+            serializer = serialize_list
+        elif hasattr(cls, "tolist"):
+            serializer = serialize_tolist
+        elif issubclass(cls, Exception):
+            serializer = serialize_exception
+        elif has_enum and issubclass(cls, Enum):
+            serializer = serialize_enum
+    _serializer_cache[cls] = serializer
+    return serializer
+
+
+# {(cls, method_name): whether cls uses the Serializable implementation}
+_uses_default_method = {}  # type: Dict[Tuple[type, str], bool]
+
+
+def uses_default_method(cls, name):
+    # type: (type, str) -> bool
+    """Return True if cls is a Serializable that doesn't override the
+    method called name, so it can be bypassed with its call_types"""
+    try:
+        return _uses_default_method[(cls, name)]
+    except KeyError:
+        pass
+    uses_default = False
+    if issubclass(cls, Serializable):
+        for base in inspect.getmro(cls):
+            if name in vars(base):
+                uses_default = base is Serializable
+                break
+    _uses_default_method[(cls, name)] = uses_default
+    return uses_default
+
+
+# {cls: its call_types in the order its __init__ takes them positionally}
+_init_arg_order = {}  # type: Dict[type, Optional[Tuple[str, ...]]]
+
+
+def init_arg_order(cls):
+    # type: (Type[WithCallTypes]) -> Optional[Tuple[str, ...]]
+    """Return the names of the call_types of cls in the order its __init__
+    takes them as positional args, or None if they aren't its leading args.
+    This is usually the order of call_types, but they can be set in the class
+    body in a different order to the __init__ they inherit"""
+    try:
+        return _init_arg_order[cls]
+    except KeyError:
+        pass
+    keys = key_tuple(cls.call_types)
+    try:
+        args = tuple(getargspec(cls.__init__).args[1:1 + len(keys)])
+    except TypeError:
+        # A slot wrapper like object.__init__ on Python2, which takes no args
+        args = ()
+    order = args if sorted(args) == sorted(keys) else None
+    _init_arg_order[cls] = order
+    return order
+
+
+def serialize_object(o, dict_cls=FrozenOrderedDict):
+    # type: (Any, Type[dict]) -> Any
+    try:
+        serializer = _serializer_cache[o.__class__]
+    except KeyError:
+        serializer = find_serializer(o.__class__)
+    if serializer is None:
         # Everything else should be serializable already
         return o
+    return serializer(o, dict_cls)
+
+
+# The types that serialize_object returns unchanged
+LEAF_TYPES = frozenset([
+    type(None), bool, int, type(2 ** 64), float, str, type(u"")])
+
+
+def make_to_dict(cls):
+    # type: (Type[Serializable]) -> Callable[[Serializable, Type[dict]], Any]
+    """Generate a to_dict function specialized for the call_types of cls,
+    with the field names inlined. Fields annotated with a leaf type skip
+    serialize_object unless they hold something else"""
+    lines = ["def to_dict(self, dict_cls):"]
+    items = []
+    if cls.typeid:
+        items.append("('typeid', typeid)")
+    for i, (k, anno) in enumerate(cls.call_types.items()):
+        lines.append("    v%d = self.%s" % (i, k))
+        if not (anno.is_array or anno.is_mapping) and anno.typ in LEAF_TYPES:
+            expr = "v%d if v%d.__class__ in leaf_types else " \
+                   "serialize(v%d, dict_cls)" % (i, i, i)
+        else:
+            expr = "serialize(v%d, dict_cls)" % i
+        items.append("(%r, %s)" % (k, expr))
+    lines.append(
+        "    return dict_cls((%s))" % "".join(x + ", " for x in items))
+    namespace = dict(
+        typeid=cls.typeid, leaf_types=LEAF_TYPES,
+        serialize=serialize_object)  # type: Dict[str, Any]
+    exec("\n".join(lines), namespace)
+    return namespace["to_dict"]
+
+
+def make_from_dict_args(cls):
+    # type: (Type[Serializable]) -> Callable[[Dict[str, Any]], Optional[Tuple]]
+    """Generate a function that returns the positional args to pass to cls
+    from a dict holding exactly its call_types (and maybe typeid), or None
+    if it holds anything else, or cls can't take them positionally"""
+    keys = init_arg_order(cls)
+    if keys is None:
+        lines = [
+            "def from_dict_args(d):",
+            "    return None"]
+    else:
+        lines = [
+            "def from_dict_args(d):",
+            "    if len(d) != %d + ('typeid' in d):" % len(keys),
+            "        return None",
+            "    try:",
+            "        return (%s)" % "".join("d[%r], " % k for k in keys),
+            "    except KeyError:",
+            "        return None"]
+    namespace = {}  # type: Dict[str, Any]
+    exec("\n".join(lines), namespace)
+    return namespace["from_dict_args"]
 
 
 T = TypeVar("T")
@@ -100,6 +626,133 @@ def deserialize_object(ob, type_check=None):
     return ob
 
 
+def make_type_converter(typ):
+    # type: (Any) -> Optional[Callable[[Any], Any]]
+    """Make a function that converts a decoded value to an instance of typ,
+    or None if it should be passed through unchanged"""
+    if not inspect.isclass(typ):
+        # Like Any or a Union
+        return None
+    elif issubclass(typ, Serializable):
+        def convert(value):
+            if isinstance(value, dict):
+                value = deserialize_typed(value, typ)
+            return value
+        return convert
+    elif has_enum and issubclass(typ, Enum):
+        def convert(value):
+            if not isinstance(value, typ):
+                value = typ(value)
+            return value
+        return convert
+    else:
+        return None
+
+
+def make_anno_converter(anno):
+    # type: (Anno) -> Optional[Callable[[Any], Any]]
+    """Make a function that converts a decoded value to the type of anno,
+    or None if it should be passed through unchanged"""
+    if anno.is_array:
+        array_cls = anno._array_cls
+        element = make_type_converter(anno.typ)
+        if element:
+            def convert(value):
+                if isinstance(value, list):
+                    value = [element(v) for v in value]
+                return to_array(array_cls, value)
+            return convert
+        try:
+            import numpy as np
+        except ImportError:
+            has_numpy = False
+        else:
+            has_numpy = True
+        if has_numpy and buffer_formats(anno.typ):
+            # Numbers and bools, so make a numpy array of the right dtype
+            def convert(value):
+                if isinstance(value, dict) and NDARRAY_KEY in value:
+                    value = deserialize_ndarray(value)
+                elif isinstance(value, list):
+                    try:
+                        arr = np.array(value)
+                    except (OverflowError, TypeError, ValueError):
+                        # Ragged or not numbers, let to_array decide
+                        pass
+                    else:
+                        # Only convert if no value would change, so floats
+                        # aren't truncated into ints, or strs parsed
+                        if np.can_cast(arr.dtype, anno.typ, "safe"):
+                            value = arr.astype(anno.typ, copy=False)
+                return to_array(array_cls, value)
+            return convert
+
+        def convert(value):
+            return to_array(array_cls, value)
+        return convert
+    elif anno.is_mapping:
+        ktyp, vtyp = anno.typ
+        kconvert = make_type_converter(ktyp)
+        vconvert = make_type_converter(vtyp)
+        if kconvert is None and vconvert is None:
+            return None
+        kconvert = kconvert or (lambda k: k)
+        vconvert = vconvert or (lambda v: v)
+
+        def convert(value):
+            if isinstance(value, dict):
+                value = value.__class__(
+                    (kconvert(k), vconvert(v)) for k, v in value.items())
+            return value
+        return convert
+    else:
+        return make_type_converter(anno.typ)
+
+
+def make_typed_plan(cls):
+    # type: (Type[Serializable]) -> Dict[str, Callable[[Any], Any]]
+    """Make a plan for deserialize_typed() of {name: converter} for each of
+    the call_types of cls whose decoded values need converting"""
+    converters = []
+    for k, anno in cls.call_types.items():
+        converter = make_anno_converter(anno)
+        if converter:
+            converters.append((k, converter))
+    return FrozenOrderedDict(converters)
+
+
+def deserialize_typed(ob, type_check=None):
+    # type: (Any, Union[Type[T], Tuple[Type[T], ...]]) -> T
+    """Like deserialize_object(), but use the call_types of the class to
+    recursively convert the values it is passed into their annotated types,
+    so Arrays of Serializables, Mappings of them and Enums are constructed,
+    and numeric Arrays are made into numpy arrays if numpy is available
+
+    Args:
+        ob: The decoded value, like the output of json_decode()
+        type_check: If given, assert the result is an instance of this
+    """
+    if isinstance(ob, dict):
+        cls = Serializable.lookup_subclass(ob)
+        try:
+            plan = cls._typed_plan_lookup[cls]
+        except KeyError:
+            plan = cls._typed_plan_lookup[cls] = make_typed_plan(cls)
+        if plan:
+            d = {}
+            for k, v in ob.items():
+                converter = plan.get(k, None)
+                if converter:
+                    v = converter(v)
+                d[k] = v
+            ob = d
+        ob = cls.from_dict(ob)
+    if type_check is not None:
+        assert isinstance(ob, type_check), \
+            "Expected %s, got %r" % (type_check, type(ob))
+    return ob
+
+
 class Serializable(WithCallTypes):
     """Base class for serializable objects"""
 
@@ -109,6 +762,15 @@ class Serializable(WithCallTypes):
     # dict mapping typeid name -> cls
     _subcls_lookup = {}  # type: Dict[str, Serializable]
 
+    # dict mapping cls -> generated to_dict function
+    _to_dict_lookup = {}  # type: Dict[Type[Serializable], Callable]
+
+    # dict mapping cls -> generated function returning args for from_dict
+    _from_dict_args_lookup = {}  # type: Dict[Type[Serializable], Callable]
+
+    # dict mapping cls -> converters for deserialize_typed()
+    _typed_plan_lookup = {}  # type: Dict[Type[Serializable], Dict]
+
     __slots__ = []  # type: List[str]
 
     def __getitem__(self, item):
@@ -133,15 +795,12 @@ class Serializable(WithCallTypes):
         Returns:
             OrderedDict serialised version of self
         """
-        if self.typeid:
-            keys = ["typeid"] + list(self.call_types)
-        else:
-            keys = self.call_types
-
-        pairs = ((k, serialize_object(getattr(self, k), dict_cls))
-                 for k in keys)
-        d = dict_cls(pairs)
-        return d
+        cls = self.__class__
+        try:
+            to_dict = self._to_dict_lookup[cls]
+        except KeyError:
+            to_dict = self._to_dict_lookup[cls] = make_to_dict(cls)
+        return to_dict(self, dict_cls)
 
     @classmethod
     def from_dict(cls, d, ignore=()):
@@ -154,6 +813,24 @@ class Serializable(WithCallTypes):
         Returns:
             Instance of this class
         """
+        if not ignore:
+            try:
+                from_dict_args = cls._from_dict_args_lookup[cls]
+            except KeyError:
+                from_dict_args = cls._from_dict_args_lookup[cls] = \
+                    make_from_dict_args(cls)
+            args = from_dict_args(d)
+            if args is not None:
+                # d has exactly the keys we need, so pass them positionally
+                if "typeid" in d:
+                    assert d["typeid"] == cls.typeid, \
+                        "Dict has typeid %s but %s has typeid %s" % \
+                        (d["typeid"], cls, cls.typeid)
+                try:
+                    return cls(*args)
+                except TypeError as e:
+                    raise TypeError(
+                        "%s raised error: %s" % (cls.typeid, str(e)))
         filtered = {}
         for k, v in d.items():
             if k == "typeid":
@@ -204,3 +881,6 @@ class Serializable(WithCallTypes):
             raise TypeError("'%s' not a valid typeid" % typeid)
         else:
             return subclass
+
+
+_object_pairs_hook = make_object_pairs_hook()
@@ -0,0 +1,121 @@
+from itertools import starmap
+from operator import attrgetter
+
+from ._array import Array, SeqView, buffer_formats, to_array
+from ._compat import str_
+from ._frozen_dict import key_tuple
+from ._serializable import init_arg_order
+from ._typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Dict, Any, Sequence, List, Tuple, Type, Optional
+    from ._calltypes import WithCallTypes
+
+# {cls: structured dtype} for classes with no str fields to measure
+_structured_dtypes = {}  # type: Dict[type, Any]
+
+
+def structured_dtype(cls, seq=None):
+    # type: (Type[WithCallTypes], Optional[Sequence]) -> Any
+    """Make a numpy structured dtype with a field for each of the call_types
+    of cls, which must all be bool, int, float, numpy scalar or str
+
+    Args:
+        cls: The WithCallTypes class, like a Serializable
+        seq: Instances of cls to measure the length of any str fields from,
+            if their Anno doesn't have a max_length
+    """
+    try:
+        return _structured_dtypes[cls]
+    except KeyError:
+        pass
+    import numpy as np
+    fields = []  # type: List[Tuple[str, Any]]
+    measured = False
+    for k, anno in cls.call_types.items():
+        if anno.is_array or anno.is_mapping:
+            raise ValueError("%s.%s is not a scalar" % (cls.__name__, k))
+        elif buffer_formats(anno.typ):
+            fields.append((k, np.dtype(anno.typ)))
+        elif anno.typ in (str, type(u""), str_):
+            length = anno.max_length
+            if length is None:
+                if seq is None:
+                    raise ValueError(
+                        "%s.%s needs a max_length or instances to measure" % (
+                            cls.__name__, k))
+                measured = True
+                length = max([len(getattr(x, k)) for x in seq] or [0])
+            # Python2 str is bytes. Zero length strings aren't allowed
+            kind = "U" if anno.typ is type(u"") else "S"
+            fields.append((k, np.dtype("%s%d" % (kind, max(length, 1)))))
+        else:
+            raise ValueError("%s.%s has type %r which is not a scalar" % (
+                cls.__name__, k, anno.typ))
+    dtype = np.dtype(fields)
+    if not measured:
+        _structured_dtypes[cls] = dtype
+    return dtype
+
+
+def to_structured_array(seq, cls=None):
+    # type: (Sequence, Optional[Type[WithCallTypes]]) -> Any
+    """Pack instances of a WithCallTypes class whose call_types are all
+    scalar into a numpy structured array in bulk, with a field per call_type.
+    The result is a single contiguous block of memory, and its fields are
+    vectorized views for filtering, like arr[arr["x"] > 0]
+
+    Args:
+        seq: The instances, like an Array[cls]
+        cls: The class of the instances, defaults to the typ of the Array
+    """
+    import numpy as np
+    if isinstance(seq, Array):
+        cls = cls or seq.typ
+        seq = seq.seq
+        if isinstance(seq, SeqView):
+            seq = seq.materialize()
+    assert cls is not None, "Need cls to pack a %s" % type(seq).__name__
+    dtype = structured_dtype(cls, seq)
+    arr = np.empty(len(seq), dtype=dtype)
+    # Fill a column at a time, so numbers are converted straight into the
+    # array rather than into a tuple per element first
+    for k in cls.call_types:
+        field = dtype[k]
+        values = map(attrgetter(k), seq)
+        if field.kind in "US":
+            strings = list(values)
+            # numpy would silently truncate anything longer than the field
+            width = field.itemsize // (4 if field.kind == "U" else 1)
+            longest = max(strings, key=len) if strings else ""
+            if len(longest) > width:
+                raise ValueError("%s.%s: Expected length <= %d, got %r" % (
+                    cls.__name__, k, width, longest))
+            arr[k] = strings
+        else:
+            arr[k] = np.fromiter(values, field, len(seq))
+    return arr
+
+
+def from_structured_array(arr, cls):
+    # type: (Any, Type[WithCallTypes]) -> Array
+    """Unpack a numpy structured array made by to_structured_array() into an
+    Array[cls], calling cls with the fields of each element positionally, or
+    by name if its call_types aren't in the order its __init__ takes them
+
+    Args:
+        arr: The structured array, with a field for each of the call_types
+            of cls
+        cls: The class to make instances of
+    """
+    keys = key_tuple(cls.call_types)
+    assert arr.dtype.names == keys, \
+        "Expected fields %s, got %s" % (keys, arr.dtype.names)
+    # tolist() converts every field to a builtin type in a single call
+    rows = arr.tolist()
+    if init_arg_order(cls) == keys:
+        instances = list(starmap(cls, rows))
+    else:
+        make = cls  # type: Any
+        instances = [make(**dict(zip(keys, row))) for row in rows]
+    return to_array(Array[cls], instances)  # type: ignore
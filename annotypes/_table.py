@@ -0,0 +1,211 @@
+from ._array import Array, ArrayBuilder, SeqView, VIEWABLE, buffer_formats, \
+    to_array
+from ._calltypes import CallTypesMeta, WithCallTypes
+from ._compat import add_metaclass, zip_
+from ._typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Any, Iterable, Iterator, List, Optional, Sequence, \
+        Tuple
+
+
+class TableMeta(CallTypesMeta):
+    def __call__(cls, *args, **kwargs):
+        # Check the column lengths once, after the subclass __init__ has set
+        # them, rather than on every row access
+        inst = super(TableMeta, cls).__call__(*args, **kwargs)
+        inst.validate()
+        return inst
+
+
+def growable_column(anno, column):
+    # type: (Any, Sequence) -> Any
+    """Make storage holding the elements of column that can be appended to
+    without invalidating Arrays that view the part already used"""
+    try:
+        import numpy as np
+    except ImportError:
+        has_numpy = False
+    else:
+        has_numpy = True
+    if has_numpy and buffer_formats(anno.typ):
+        # numpy storage that doubles when full, frozen views don't copy
+        builder = ArrayBuilder[np.dtype(anno.typ).type]()  # type: ignore
+        builder.extend(column)
+        return builder
+    else:
+        # Lists only ever grow, so SeqViews of the used part stay valid
+        return list(column)
+
+
+def view_column(anno, storage):
+    # type: (Any, Any) -> Array
+    """Make an Array of the column typ viewing the used part of storage made
+    by growable_column()"""
+    if isinstance(storage, ArrayBuilder):
+        seq = storage.freeze().seq  # type: Any
+    elif VIEWABLE:
+        seq = SeqView(storage, range(len(storage)))
+    else:
+        # Python2 can't view, so copy
+        seq = storage[:]
+    return anno._array_cls(seq)
+
+
+@add_metaclass(TableMeta)
+class Table(WithCallTypes):
+    """Base class for a table with a column for each of its call_types, which
+    should all be Arrays of the same length
+
+    The lengths are checked once on construction, then cached, so rows can be
+    accessed in O(1). Setting a column attribute means they will be checked
+    again on next access
+    """
+
+    # The validated columns in call_types order, None if not checked yet
+    _columns = None  # type: Optional[Tuple[Any, ...]]
+    # The length of every column
+    _length = 0
+    # Growable storage for each column made by append_rows()
+    _storages = None  # type: Optional[List[Any]]
+
+    def __setattr__(self, name, value):
+        if name in self.call_types:
+            # Replacing a column, so need to check the lengths again
+            self._columns = None
+            self._storages = None
+        object.__setattr__(self, name, value)
+
+    def validate(self):
+        # type: () -> None
+        """Check that the columns all have the same length and cache them"""
+        columns = tuple(getattr(self, a) for a in self.call_types)
+        lengths = {a: len(c) for a, c in zip(self.call_types, columns)}
+        assert len(set(lengths.values())) <= 1, \
+            "Column lengths %s don't match" % lengths
+        self._length = len(columns[0]) if columns else 0
+        self._columns = columns
+
+    def _validated_columns(self):
+        # type: () -> Tuple[Any, ...]
+        columns = self._columns
+        if columns is None:
+            self.validate()
+            columns = self._columns
+            assert columns is not None
+        return columns
+
+    def _make(self, columns):
+        # type: (Sequence[Array]) -> Table
+        # Pass columns by name, as call_types may not be in __init__ order
+        cls = self.__class__  # type: Any
+        return cls(**dict(zip(self.call_types, columns)))
+
+    def __len__(self):
+        # type: () -> int
+        self._validated_columns()
+        return self._length
+
+    def __getitem__(self, item):
+        """Return a row as a list of values in call_types order, or a table
+        viewing the columns if item is a slice"""
+        columns = self._validated_columns()
+        if item.__class__ is slice:
+            return self._make([c[item] for c in columns])
+        return [c[item] for c in columns]
+
+    def __iter__(self):
+        # type: () -> Iterator[Tuple]
+        """Iterate over the rows as tuples of values in call_types order"""
+        return iter(zip_(*self._validated_columns()))
+
+    def take(self, indices):
+        # type: (Any) -> Table
+        """Return a new table of the rows at indices, selecting from each
+        column in a single vectorized operation
+
+        Args:
+            indices: The row indices, like a numpy int array
+        """
+        import numpy as np
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = []
+        for anno, column in zip(
+                self.call_types.values(), self._validated_columns()):
+            array_cls = anno._array_cls  # type: Any
+            if buffer_formats(anno.typ):
+                seq = np.asarray(column, dtype=anno.typ)[indices]
+            else:
+                seq = [column[i] for i in indices.tolist()]
+            columns.append(to_array(array_cls, seq))
+        return self._make(columns)
+
+    def where(self, mask):
+        # type: (Any) -> Table
+        """Return a new table of the rows where mask is True
+
+        Args:
+            mask: A bool per row, like np.asarray(table.x) > 0
+        """
+        import numpy as np
+        mask = np.asarray(mask, dtype=bool)
+        assert len(mask) == len(self), \
+            "Expected mask of length %d, got %d" % (len(self), len(mask))
+        return self.take(np.flatnonzero(mask))
+
+    def sort_by(self, name, reverse=False):
+        # type: (str, bool) -> Table
+        """Return a new table with the rows sorted by a column. The sort is
+        stable, so rows with equal values keep their order
+
+        Args:
+            name: The name of the column to sort by
+            reverse: If True then sort in descending order
+        """
+        import numpy as np
+        assert name in self.call_types, \
+            "%s has no column %r" % (self.__class__.__name__, name)
+        key = np.asarray(getattr(self, name))
+        if reverse:
+            # Sort the reversed key then map back, so ties stay in order
+            order = len(key) - 1 - np.argsort(key[::-1], kind="mergesort")
+            order = order[::-1]
+        else:
+            order = np.argsort(key, kind="mergesort")
+        return self.take(order)
+
+    def append_rows(self, rows):
+        # type: (Iterable[Sequence]) -> None
+        """Append rows of values in call_types order. Each column is replaced
+        by an Array viewing storage that grows geometrically, so appending n
+        rows over any number of calls costs amortized O(n) rather than
+        copying every column each time
+
+        Args:
+            rows: The rows to append, each a sequence with a value per column
+        """
+        columns = self._validated_columns()
+        rows = list(rows)
+        annos = list(self.call_types.values())
+        for i, row in enumerate(rows):
+            # zip() would silently truncate to the shortest row
+            if len(row) != len(annos):
+                raise ValueError("Row %d has %d values, expected %d" % (
+                    i, len(row), len(annos)))
+        new_columns = list(zip(*rows))
+        if not new_columns:
+            return
+        storages = self._storages
+        if storages is None:
+            storages = [growable_column(anno, column)
+                        for anno, column in zip(annos, columns)]
+        appended = []
+        for anno, storage, values in zip(annos, storages, new_columns):
+            storage.extend(values)
+            appended.append(view_column(anno, storage))
+        for name, column in zip(self.call_types, appended):
+            # Skip our __setattr__ as we know the lengths match
+            object.__setattr__(self, name, column)
+        self._columns = tuple(appended)
+        self._length += len(new_columns[0])
+        self._storages = storages
@@ -0,0 +1,207 @@
+import ast
+import inspect
+import linecache
+import re
+import tokenize
+
+from ._comment_cache import source_stamp
+from ._typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from typing import Dict, Callable, List, Optional, Any, Iterator, Tuple
+
+type_re = re.compile('^# type: ([^-]*)( -> (.*))?$')
+
+FUNCTION_NODES = tuple(getattr(ast, x) for x in (
+    "FunctionDef", "AsyncFunctionDef") if hasattr(ast, x))
+
+# The fields of ast nodes that hold lists of statements (or except handlers)
+STATEMENT_LIST_FIELDS = ("body", "orelse", "handlers", "finalbody")
+
+# The tokens of a type expression: ellipsis, dotted names, strings, or any
+# other single character
+type_token_re = re.compile(r"""\s*(\.\.\.|[\w.]+|'[^']*'|"[^"]*"|\S)""")
+
+
+def strip_trailing_comment(comment):
+    # type: (str) -> str
+    """Remove a comment after a type comment, like "# type: int  # noqa",
+    leaving any # in a quoted forward reference"""
+    if comment.startswith("# type:"):
+        for match in type_token_re.finditer(comment, len("# type:")):
+            if match.group(1) == "#":
+                return comment[:match.start(1)].rstrip()
+    return comment
+
+
+def split_type_list(expr):
+    # type: (str) -> List[str]
+    """Split the arg part of a type comment like "(int, Callable[..., int])"
+    into a normalized string per argument, like ["int", "Callable[..., int]"]
+    """
+    tokens = type_token_re.findall(expr)
+    # Remove the brackets round the whole list, not just round its first item
+    # like "(int), (str)"
+    if tokens and tokens[0] == "(":
+        depth = 0
+        for i, token in enumerate(tokens):
+            if token in "([{":
+                depth += 1
+            elif token in ")]}":
+                depth -= 1
+            if depth == 0:
+                if i == len(tokens) - 1:
+                    tokens = tokens[1:-1]
+                break
+    # Split on the commas that aren't in brackets
+    parts = [[]]  # type: List[List[str]]
+    depth = 0
+    for token in tokens:
+        if token in "([{":
+            depth += 1
+        elif token in ")]}":
+            depth -= 1
+        elif token == "," and depth == 0:
+            parts.append([])
+            continue
+        parts[-1].append(token)
+    return [join_tokens(part) for part in parts if part]
+
+
+def join_tokens(tokens):
+    # type: (List[str]) -> str
+    """Join tokens of a type expression with normalized whitespace"""
+    text = ""
+    last_word = False
+    for token in tokens:
+        word = token[0].isalnum() or token[0] == "_"
+        if token == ",":
+            text += ", "
+        elif token == "|":
+            text += " | "
+        elif word and last_word:
+            text += " " + token
+        else:
+            text += token
+        last_word = word
+    return text
+
+
+def parse_signature_comments(lines):
+    # type: (List[str]) -> Optional[List]
+    """Parse the type comments in the lines of a function signature
+
+    Returns:
+        [arg_type_strings, return_type_string], or None if there are no type
+        comments. The return type string is None if there was no ->
+    """
+    arg_types = []  # type: List[str]
+    found = False
+    it = iter(lines)
+    try:
+        for typ, string, _, _, _ in tokenize.generate_tokens(
+                lambda: next(it)):
+            if typ == tokenize.COMMENT:
+                match = type_re.match(strip_trailing_comment(string))
+                if match:
+                    found = True
+                    parts = match.groups()
+                    # (...) is used to represent all the args so far
+                    if parts[0] != "(...)":
+                        arg_types += split_type_list(parts[0].replace("*", ""))
+                    if parts[1]:
+                        # Got a return, done
+                        returns = ", ".join(split_type_list(parts[2]))
+                        return [arg_types, returns]
+    except tokenize.TokenError:
+        # The lines stopped part way through a statement, like a multi-line
+        # docstring on Python < 3.8
+        pass
+    if found:
+        return [arg_types, None]
+    return None
+
+
+def iter_functions(statements):
+    # type: (List[Any]) -> Iterator[Any]
+    """Yield the function definitions in a list of ast statements, without
+    descending into expressions where there can't be any"""
+    stack = [statements]
+    while stack:
+        for node in stack.pop():
+            if isinstance(node, FUNCTION_NODES):
+                yield node
+            for field in STATEMENT_LIST_FIELDS:
+                children = getattr(node, field, None)
+                if children:
+                    stack.append(children)
+
+
+def build_index(lines):
+    # type: (List[str]) -> Dict[int, List]
+    """Find the type comments of every function in a module's source with a
+    single ast pass, tokenizing only the signatures that contain them
+
+    Args:
+        lines: The source lines of the module
+
+    Returns:
+        {first_line: [arg_type_strings, return_type_string]} for every
+        function with a type comment, where first_line matches its
+        co_firstlineno. The return type string is None if there was no ->
+    """
+    index = {}  # type: Dict[int, List]
+    for node in iter_functions(ast.parse("".join(lines)).body):
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        # The signature stops before the first statement of the body
+        first = node.body[0]
+        body_start = min([first.lineno] + [
+            d.lineno for d in getattr(first, "decorator_list", [])])
+        signature = lines[start - 1:max(start, body_start - 1)]
+        if any("# type:" in line for line in signature):
+            comment = parse_signature_comments(signature)
+            if comment:
+                index[start] = comment
+    return index
+
+
+# {filename: (stamp, index)}
+_indexes = {}  # type: Dict[str, Tuple[Optional[List], Dict[int, List]]]
+
+
+def parse_type_comment(f):
+    # type: (Callable) -> Optional[List]
+    """Find the Python2 type comment of a function from the index of its
+    module's source
+
+    Args:
+        f: The function to examine for type comments
+
+    Returns:
+        [arg_type_strings, return_type_string], or None if there is no type
+        comment
+    """
+    filename = f.__code__.co_filename
+    try:
+        stamp = source_stamp(filename)  # type: Optional[List]
+    except OSError:
+        # Not a real file, like code made by exec
+        stamp = None
+    indexed = _indexes.get(filename, None)
+    if indexed is not None and indexed[0] == stamp:
+        index = indexed[1]
+    else:
+        # Not indexed, or the source was edited since, so drop any stale
+        # lines linecache has
+        linecache.checkcache(filename)
+        lines = linecache.getlines(filename, getattr(f, "__globals__", None))
+        if not lines:
+            # Raise the same error as if we'd asked for the source
+            inspect.getsourcelines(f)
+        index = build_index(lines)
+        _indexes[filename] = (stamp, index)
+    comment = index.get(f.__code__.co_firstlineno, None)
+    if comment and comment[1] is None:
+        # We found a type comment, but not the return value, error
+        raise ValueError("Got to the end of the function without seeing ->")
+    return comment
@@ -2,7 +2,7 @@ import sys
 
 from typing import (
     TYPE_CHECKING, TypeVar, Sequence, Union, Optional, Generic,
-    overload, Mapping, Any
+    overload, Mapping, Any, Iterator
 )
 if sys.version_info >= (3, 7):
     from abc import ABCMeta as GenericMeta
@@ -1,15 +1,26 @@
 import unittest
 import sys
+import array
 import collections
+import linecache
+import os
+import pickle
+import shutil
+import struct
+import tempfile
 
 import numpy as np
+from typing import Callable, Tuple
 
 from annotypes import WithCallTypes, Array, Sequence, Anno, Union, \
     add_call_types, Any, to_array, array_type, TypeVar, Generic, \
-    make_annotations
+    make_annotations, mmap_array, ArrayBuilder, NO_DEFAULT, Optional, \
+    structured_dtype, to_structured_array, from_structured_array
 
 with Anno("Good origin"):
     Good = str
+with Anno("A short name", max_length=3):
+    AShort = str
 
 
 class TestAnnotypes(unittest.TestCase):
@@ -46,8 +57,66 @@ class TestAnnotypes(unittest.TestCase):
                 Bad = [str][1]
         assert str(cm.exception) == "list index out of range"
 
+    def test_anno_in_class_body(self):
+        class Annos(object):
+            first = 1
+            with Anno("A class attribute"):
+                AClassAttr = int
+            last = 2
+
+        if sys.version_info >= (3, 6):
+            # Defining the Anno doesn't change the definition order
+            assert [k for k in vars(Annos) if not k.startswith("__")] == [
+                "first", "AClassAttr", "last"]
+        assert Annos.AClassAttr.name == "AClassAttr"
+        assert Annos.AClassAttr.typ is int
+        # The snapshot of names is released once the name is found
+        assert Annos.AClassAttr._names_on_enter is None
+        assert Good._names_on_enter is None
+
+    def test_two_names_defined(self):
+        with self.assertRaises(AssertionError):
+            class Annos(object):
+                with Anno("Two things"):
+                    AThing = int
+                    AnotherThing = str
+
 
 class TestWithCallTypes(unittest.TestCase):
+    def test_derived_annos_shared(self):
+        @add_call_types
+        def f(a=32, b=32, c=True, d=None, e=[]):
+            # type: (Good, Good, Good, Good, Good) -> None
+            pass
+
+        @add_call_types
+        def g(a=32, e=[]):
+            # type: (Good, Good) -> None
+            pass
+
+        assert not hasattr(Good, "__dict__")
+        assert f.call_types["a"] is f.call_types["b"] is g.call_types["a"]
+        assert f.call_types["a"] is not Good
+        assert f.call_types["a"].default == 32
+        # 1 == True, but they are different defaults
+        assert f.call_types["c"].default is True
+        assert f.call_types["d"].default is None
+        # Unhashable defaults get their own copy
+        assert f.call_types["e"] is not g.call_types["e"]
+
+        @add_call_types
+        def h(a=32, b=0.0, c=-0.0, d=(0, 1), e=(0.0, 1.0)):
+            # type: (Good, Good, Good, Good, Good) -> None
+            pass
+
+        # Equal defaults that aren't interchangeable keep their own values
+        assert h.call_types["a"] is f.call_types["a"] is not h.call_types["b"]
+        assert repr(h.call_types["b"].default) == "0.0"
+        assert repr(h.call_types["c"].default) == "-0.0"
+        assert h.call_types["d"].default == (0, 1)
+        assert type(h.call_types["e"].default[0]) is float
+        assert Good.default is NO_DEFAULT
+
     def test_bad_arg_type(self):
         with self.assertRaises(ValueError) as cm:
             @add_call_types
@@ -57,6 +126,111 @@ class TestWithCallTypes(unittest.TestCase):
         assert str(cm.exception) == \
             "Error evaluating '(NonExistant)': name 'NonExistant' is not defined"
 
+    def test_comment_cache(self):
+        from annotypes import _comment_cache, _type_comments
+        tmpdir = tempfile.mkdtemp()
+        source = os.path.join(tmpdir, "commented_mod.py")
+        with open(source, "w") as f:
+            f.write("def f(a, b):\n"
+                    "    # type: (int, str) -> float\n"
+                    "    pass\n")
+        sys.path.insert(0, tmpdir)
+        getlines = linecache.getlines
+        # The cache is written like bytecode, so make sure that is enabled
+        dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+        try:
+            import commented_mod
+            expected = dict(a=int, b=str, **{"return": float})
+            assert make_annotations(commented_mod.f, {}) == expected
+            _comment_cache.write_caches()
+            cache_path = os.path.join(
+                tmpdir, "__pycache__", "commented_mod.annotypes.json")
+            assert os.path.exists(cache_path)
+            # A fresh process only reads the cache, not the source
+            _comment_cache._caches.clear()
+            _type_comments._indexes.clear()
+            linecache.getlines = None
+            assert make_annotations(commented_mod.f, {}) == expected
+            assert make_annotations(commented_mod.f) == dict(
+                a="int", b="str", **{"return": "float"})
+            # Changing the source invalidates the cache, even in this process
+            linecache.getlines = getlines
+            with open(source, "a") as f:
+                f.write("# Changed\n")
+            cache = _comment_cache._cache_for(
+                commented_mod.f.__code__.co_filename)
+            assert cache.entries == {}
+        finally:
+            sys.dont_write_bytecode = dont_write_bytecode
+            linecache.getlines = getlines
+            sys.path.remove(tmpdir)
+            sys.modules.pop("commented_mod", None)
+            _comment_cache._caches.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_comment_cache_location(self):
+        from annotypes._comment_cache import CommentCache
+        tmpdir = tempfile.mkdtemp()
+        source = os.path.join(tmpdir, "located_mod.py")
+        with open(source, "w") as f:
+            f.write("\n")
+        dont_write_bytecode = sys.dont_write_bytecode
+        try:
+            # Not written if Python isn't writing bytecode
+            sys.dont_write_bytecode = True
+            cache = CommentCache(source)
+            cache.dirty = True
+            cache.write()
+            assert not os.path.exists(cache.path)
+            sys.dont_write_bytecode = False
+            if hasattr(sys, "pycache_prefix"):
+                # Written under pycache_prefix like bytecode
+                pycache_prefix = sys.pycache_prefix
+                sys.pycache_prefix = os.path.join(tmpdir, "prefix")
+                try:
+                    cache = CommentCache(source)
+                finally:
+                    sys.pycache_prefix = pycache_prefix
+                cache.dirty = True
+                cache.write()
+                assert cache.path.startswith(os.path.join(tmpdir, "prefix"))
+                assert os.path.exists(cache.path)
+            assert not os.path.exists(os.path.join(tmpdir, "__pycache__"))
+        finally:
+            sys.dont_write_bytecode = dont_write_bytecode
+            shutil.rmtree(tmpdir)
+
+    def test_comment_cache_reload(self):
+        tmpdir = tempfile.mkdtemp()
+        source = os.path.join(tmpdir, "reloaded_mod.py")
+
+        def write_source(typ):
+            with open(source, "w") as f:
+                f.write("def f(a):\n"
+                        "    # type: (%s) -> None\n"
+                        "    pass\n" % typ)
+            # Make sure the edit is seen even within the mtime resolution
+            mtime = os.stat(source).st_mtime + len(typ)
+            os.utime(source, (mtime, mtime))
+
+        write_source("int")
+        sys.path.insert(0, tmpdir)
+        try:
+            import reloaded_mod
+            assert make_annotations(reloaded_mod.f)["a"] == "int"
+            write_source("float")
+            if sys.version_info < (3,):
+                reload(reloaded_mod)  # noqa
+            else:
+                import importlib
+                importlib.reload(reloaded_mod)
+            assert make_annotations(reloaded_mod.f)["a"] == "float"
+        finally:
+            sys.path.remove(tmpdir)
+            sys.modules.pop("reloaded_mod", None)
+            shutil.rmtree(tmpdir)
+
     def test_no_return(self):
         with self.assertRaises(ValueError) as cm:
             @add_call_types
@@ -100,6 +274,49 @@ class TestWithCallTypes(unittest.TestCase):
         assert annotations == {"a": "Dict[Callable[..., int], Union[str, int, None]]",
                                "b": "Bad", "return": None}
 
+    def test_make_annotations_per_arg(self):
+        def decorate(f):
+            return f
+
+        @decorate
+        def f(a,  # type: Callable[..., int]
+              b=None,  # type: Union[int, None]
+              *args  # type: str
+              ):
+            # type: (...) -> Tuple[int, str]
+            # type: (ignored) -> Ignored
+            def g(c):
+                # type: (float) -> "Forward"
+                pass
+            return g
+
+        annotations = make_annotations(f)
+        assert annotations == {"a": "Callable[..., int]",
+                               "b": "Union[int, None]", "args": "str",
+                               "return": "Tuple[int, str]"}
+        assert make_annotations(f(1)) == {"c": "float", "return": "Forward"}
+        annotations = make_annotations(f, dict(
+            Callable=Callable, Union=Union, Tuple=Tuple))
+        assert annotations == {"a": Callable[..., int],
+                               "b": Union[int, None], "args": str,
+                               "return": Tuple[int, str]}
+
+    def test_make_annotations_trailing_comments(self):
+        def f(a,  # type: int  # pragma: no cover
+              b,  # type: "Lit#eral"  # noqa: E501
+              ):
+            # type: (...) -> None  # noqa
+            return
+
+        def g(a):
+            # type: (Dict[str, int]) -> int  # pragma: no cover
+            return
+
+        annotations = make_annotations(f)
+        assert annotations == {"a": "int", "b": "Lit#eral", "return": None}
+        annotations = make_annotations(g)
+        assert annotations == {"a": "Dict[str, int]", "return": "int"}
+
     def test_make_annotations_no_comments(self):
         def f(a, b):
             return
@@ -144,6 +361,54 @@ class TestWithCallTypes(unittest.TestCase):
 
         MyGeneric("32")
 
+    def test_lazy_call_types(self):
+        class Lazy(WithCallTypes):
+            def __init__(self, name):
+                # type: (Later) -> None
+                self.name = name
+
+        class Sub(Lazy):
+            pass
+
+        # Nothing is made until first access
+        assert not isinstance(vars(Lazy)["call_types"], dict)
+        with self.assertRaises(ValueError):
+            Sub.call_types
+        # So names defined after the class can be used
+        Lazy.__init__.__globals__["Later"] = Good
+        try:
+            assert Sub.call_types == dict(name=Good)
+        finally:
+            del Lazy.__init__.__globals__["Later"]
+        assert isinstance(vars(Lazy)["call_types"], dict)
+        assert Sub("x").call_types is Sub.call_types
+        assert Sub.return_type.typ is Sub
+        assert Lazy.return_type.typ is Lazy
+
+    def test_class_body_call_types(self):
+        class Explicit(WithCallTypes):
+            call_types = collections.OrderedDict(name=Good)
+
+        class Sub(Explicit):
+            pass
+
+        assert list(Explicit.call_types) == ["name"]
+        assert Explicit.call_types["name"] is Good
+        assert Sub.call_types is Explicit.call_types
+
+    def test_string_annotations(self):
+        # Like from __future__ import annotations
+        class Strings(WithCallTypes):
+            def __init__(self, name, value=None):
+                self.name = name
+
+            __init__.__annotations__ = dict(
+                name="Good", value="Optional[Good]", **{"return": "None"})
+
+        assert list(Strings.call_types) == ["name", "value"]
+        assert Strings.call_types["name"] is Good
+        assert Strings.call_types["value"].default is None
+
     def test_subclassing_with_no_init(self):
         class Root(WithCallTypes):
             def __init__(self, name):
@@ -161,6 +426,11 @@ class TestWithCallTypes(unittest.TestCase):
         assert list(Root.call_types) == ["name"]
         assert list(Sub1.call_types) == ["name"]
         assert list(Sub2.call_types) == ["name"]
+        # Shared, immutable and with a cached tuple of names
+        assert Sub1.call_types is Sub2.call_types is Root.call_types
+        assert Root.call_types.keys() == ["name"]
+        with self.assertRaises(TypeError):
+            Sub1.call_types["other"] = Good
 
         # check subclassing including the matches_type equivalent
         assert issubclass(Sub2, Root)
@@ -203,6 +473,55 @@ class TestSimple(unittest.TestCase):
         with open(fname) as f:
             assert f.read() == "Data: something\n"
 
+    def test_structured_array(self):
+        insts = Array[self.cls]([
+            self.cls(i * 0.5, "/tmp/file%d.txt" % i) for i in range(10)])
+        arr = to_structured_array(insts)
+        assert arr.dtype.names == ("exposure", "path")
+        assert arr.dtype["exposure"] == np.float64
+        # str fields are as long as the longest value, no max_length is given
+        assert arr.dtype["path"] == np.dtype((str, 14))
+        # Fields are vectorized views
+        assert list(arr[arr["exposure"] > 3.5]["path"]) == [
+            "/tmp/file8.txt", "/tmp/file9.txt"]
+        unpacked = from_structured_array(arr[::3], self.cls)
+        assert unpacked.typ is self.cls
+        assert [repr(x) for x in unpacked] == [
+            repr(x) for x in insts[::3]]
+        assert to_structured_array(insts[8:], self.cls).tolist() == [
+            (4.0, "/tmp/file8.txt"), (4.5, "/tmp/file9.txt")]
+        with self.assertRaises(ValueError):
+            structured_dtype(self.cls)
+
+    def test_structured_array_too_long(self):
+        class Short(WithCallTypes):
+            def __init__(self, name):
+                # type: (AShort) -> None
+                self.name = name
+
+        assert to_structured_array([Short("abc")], Short).tolist() == [
+            ("abc",)]
+        with self.assertRaises(ValueError) as cm:
+            to_structured_array([Short("a"), Short("abcd")], Short)
+        assert str(cm.exception) == \
+            "Short.name: Expected length <= 3, got 'abcd'"
+
+
+    def test_structured_array_init_order(self):
+        class Base(WithCallTypes):
+            def __init__(self, name, value):
+                # type: (AShort, Good) -> None
+                self.name = name
+                self.value = value
+
+        class Reordered(Base):
+            call_types = collections.OrderedDict(
+                [("value", Good), ("name", AShort)])
+
+        arr = to_structured_array([Reordered("abc", "x")], Reordered)
+        assert arr.tolist() == [("x", "abc")]
+        inst = from_structured_array(arr, Reordered)[0]
+        assert (inst.name, inst.value) == ("abc", "x")
 
 class TestManyArgs(unittest.TestCase):
     def setUp(self):
@@ -365,6 +684,50 @@ class TestArray(unittest.TestCase):
         assert inst.seq == [1, 2, 3]
         assert inst.typ is int
 
+    def test_anno_constraints(self):
+        a = Anno("Positions", name="Pos", min=0, max=10).set_typ(
+            float, is_array=True)
+        assert a([0.5, 10]) == [0.5, 10]
+        a(np.linspace(0, 10, 1000000))
+        a(array.array("d", [1.5, 2.5]))
+        a([])
+        with self.assertRaises(ValueError) as cm:
+            a(np.array([1.0, 11.0, 2.0]))
+        assert str(cm.exception) == "Pos: Expected values <= 10, got 11.0"
+        with self.assertRaises(ValueError):
+            a([-0.5])
+        # NaN is never in range, wherever it is
+        nan = float("nan")
+        for values in ([nan, 20.0], [20.0, nan], [1.0, nan]):
+            with self.assertRaises(ValueError):
+                a(values)
+            with self.assertRaises(ValueError):
+                a(np.array(values))
+        # Slices are validated too
+        assert len(a(to_array(Array[float], [1.0, 20.0])[:1])) == 1
+        a = Anno("Axes", name="Axes", choices=["x", "y"],
+                 max_length=2).set_typ(str, is_array=True)
+        assert a(["x", "y"]) == ["x", "y"]
+        with self.assertRaises(ValueError) as cm:
+            a(["x", "z"])
+        assert str(cm.exception) == \
+            "Axes: Expected values in ['x', 'y'], got 'z'"
+        with self.assertRaises(ValueError) as cm:
+            a(["x", "x", "y"])
+        assert str(cm.exception) == "Axes: Expected length <= 2, got 3"
+        a = Anno("Ids", name="Ids", choices=[1, 2]).set_typ(
+            np.int32, is_array=True)
+        a(np.array([1, 2, 2], dtype=np.int32))
+        with self.assertRaises(ValueError):
+            a(np.array([1, 3], dtype=np.int32))
+        a = Anno("Gain", name="Gain", min=1).set_typ(int)
+        assert a(3) == 3
+        with self.assertRaises(ValueError):
+            a(0)
+        a = Anno("Name", name="Name", min_length=1).set_typ(str)
+        with self.assertRaises(ValueError):
+            a("")
+
     def test_array_type(self):
         assert array_type(Array[int]) is int
 
@@ -391,10 +754,304 @@ class TestArray(unittest.TestCase):
         assert a1 == a2
         np.testing.assert_equal(a1, a2)
 
+    def test_eq_chunked(self):
+        a1 = Array[float](np.arange(200000, dtype=float))
+        a2 = Array[float](np.arange(200000, dtype=float))
+        assert a1 == a2
+        a2.seq[150000] = 0
+        assert a1 != a2
+        assert a1 != a1[1:]
+        assert a1 == a1
+        assert a1 != Array[float](a1.seq.reshape(2, 100000))
+        assert Array[float](array.array("d", [1.0, 2.0])) == \
+            Array[float](np.array([1.0, 2.0]))
+        assert Array[float](array.array("d", [1.0, 2.0])) != \
+            Array[float](array.array("d", [1.0, 3.0]))
+
+    def test_digest(self):
+        a1 = Array[int](np.arange(3))
+        a2 = Array[int](np.arange(3))
+        assert a1.digest() is a1.digest()
+        assert a1.digest() == a2.digest()
+        # Now the digests are cached, comparison doesn't look at the seq
+        a2.seq = None
+        assert a1 == a2
+        assert Array[int](np.arange(4)).digest() != a1.digest()
+        assert Array[str](["a", "b"]).digest() == \
+            Array[str](["a", "b"]).digest()
+        assert Array[float]([1.0])[:].digest() == Array[float]([1.0]).digest()
+        assert Array[float](array.array("d", [1.0])).digest() != \
+            Array[float]([1.0]).digest()
+        assert Array[object]([object()]).digest() is None
+        # Floats without NaN take the shortcut too
+        f1, f2 = Array[float]([0.5, 1.5]), Array[float]([0.5, 1.5])
+        assert f1.digest() == f2.digest()
+        f2.seq = None
+        assert f1 == f2
+        # NaN isn't equal to itself, even if the digests match
+        n1 = Array[float](np.array([np.nan]))
+        n2 = Array[float](np.array([np.nan]))
+        assert n1.digest() == n2.digest()
+        assert n1 != n2
+        n1, n2 = [Array[float]([1.0, float("nan")]) for _ in range(2)]
+        assert n1.digest() == n2.digest()
+        assert n1 != n2
+        n1, n2 = [Array[np.float32](np.array([np.nan], dtype=np.float32))
+                  for _ in range(2)]
+        assert n1.digest() == n2.digest()
+        assert n1 != n2
+
     def test_contains(self):
         assert 1 in Array[int]([1, 2])
         assert 0 not in Array[int]([1, 2])
 
+    def test_specialized_cached(self):
+        assert Array[int] is Array[int]
+        assert Array[int] is not Array[float]
+        assert array_type(Array[float]) is float
+        inst = Array[str](["a"])
+        assert isinstance(inst, Array)
+        assert inst.__class__.__name__ == "Array"
+        assert inst.typ is str
+
+    def test_generic_subclass(self):
+        T = TypeVar("T")
+
+        class MyArray(Array[T]):
+            pass
+
+        inst = MyArray[int]([1, 2])
+        assert isinstance(inst, MyArray)
+        assert inst.typ is int
+        assert list(inst[1:]) == [2]
+        assert isinstance(inst[1:], MyArray)
+
+    def test_asarray_no_copy(self):
+        n = np.arange(3)
+        assert np.asarray(Array[int](n)) is n
+        if sys.version_info < (3,):
+            # Python2 array.array doesn't support the new buffer protocol
+            return
+        a = array.array("d", [1.0, 2.0])
+        np.asarray(Array[float](a))[0] = 5.0
+        assert a[0] == 5.0
+
+    def test_buffer(self):
+        if sys.version_info < (3,):
+            return
+        b = bytearray(struct.pack("3d", 1.0, 2.0, 3.0))
+        inst = to_array(Array[float], memoryview(b))
+        assert inst.seq.obj is b
+        assert len(inst) == 3
+        assert inst[1] == 2.0
+        assert inst == [1.0, 2.0, 3.0]
+        assert inst == Array[float](array.array("d", [1.0, 2.0, 3.0]))
+        np.asarray(inst)[0] = 4.0
+        assert struct.unpack("3d", b) == (4.0, 2.0, 3.0)
+        assert to_array(Array[bool], memoryview(b"\x01\x00")) == [True, False]
+        # Only memoryviews are reinterpreted, bytes are a sequence of ints
+        inst = to_array(Array[int], b"\x01\x02")
+        assert inst.seq == b"\x01\x02"
+        assert list(inst) == [1, 2]
+        assert list(to_array(Array[int], bytearray(b"\x01\x02"))) == [1, 2]
+        with self.assertRaises(AssertionError):
+            Array[float](memoryview(b))
+        with self.assertRaises(TypeError):
+            to_array(Array[float], memoryview(b"\x01\x00"))
+
+    def test_memoryview(self):
+        if sys.version_info < (3,):
+            return
+        a = array.array("d", [1.0, 2.0, 3.0])
+        view = Array[float](a).memoryview()
+        assert view.format == "d"
+        view[0] = 4.0
+        assert a[0] == 4.0
+        # Slices view the same storage
+        inst = Array[float](a)[::-2]
+        assert inst.memoryview().tolist() == [3.0, 4.0]
+        n = np.arange(4.0)
+        Array[float](n)[1:3].memoryview()[0] = 5.0
+        assert n[1] == 5.0
+        with self.assertRaises(TypeError):
+            Array[float]([1.0]).memoryview()
+
+    def test_mmap_array(self):
+        if sys.version_info < (3,):
+            return
+        with tempfile.NamedTemporaryFile() as f:
+            # 4 byte header, then 5 floats
+            f.write(b"HEAD" + struct.pack("5d", 0.5, 1.5, 2.5, 3.5, 4.5))
+            f.flush()
+            inst = mmap_array(Array[float], f.name, offset=4)
+            assert inst.typ is float
+            assert len(inst) == 5
+            assert inst[2] == 2.5
+            assert inst == [0.5, 1.5, 2.5, 3.5, 4.5]
+            assert inst == np.arange(5) + 0.5
+            inst = mmap_array(Array[float], f, offset=12, count=2)
+            assert inst == Array[float]([1.5, 2.5])
+            assert mmap_array(Array[float], f, count=0) == []
+            with self.assertRaises(TypeError):
+                mmap_array(Array[float], f.name)
+
+    def test_slice_view(self):
+        seq = [0, 1, 2, 3, 4, 5]
+        inst = Array[int](seq)[1:5]
+        assert isinstance(inst, Array)
+        assert inst.typ is int
+        assert len(inst) == 4
+        assert inst[0] == 1
+        assert inst[-1] == 4
+        with self.assertRaises(IndexError):
+            inst[4]
+        assert list(inst) == [1, 2, 3, 4]
+        assert inst == [1, 2, 3, 4]
+        assert inst[::2] == [1, 3]
+        assert inst[::-1] == [4, 3, 2, 1]
+        assert inst[3:1] == []
+        assert repr(inst) == "Array([1, 2, 3, 4])"
+        assert to_array(Array[int], inst) is inst
+        assert pickle.loads(pickle.dumps(inst)) == [1, 2, 3, 4]
+        assert list(np.asarray(inst)) == [1, 2, 3, 4]
+        if sys.version_info < (3,):
+            # Python2 slices are copies
+            return
+        assert inst.seq.seq is seq
+        assert inst[::-1].seq.seq is seq
+
+    def test_slice_view_types(self):
+        if sys.version_info < (3,):
+            return
+        inst = Array[int]((0, 1, 2, 3))[1:]
+        assert inst.seq.materialize() == (1, 2, 3)
+        inst = Array[float](array.array("d", [0.0, 1.0, 2.0]))[::2]
+        assert inst == [0.0, 2.0]
+        inst = Array[int](np.arange(4))[1:3]
+        assert inst.typ is int
+        assert isinstance(inst.seq, np.ndarray)
+        assert inst == [1, 2]
+
+    def test_compact(self):
+        inst = to_array(Array[float], [0.5, 1.5], compact=True)
+        assert inst.seq == array.array("d", [0.5, 1.5])
+        assert inst == [0.5, 1.5]
+        # Packed tuples still compare equal to unpacked ones
+        assert to_array(Array[float], (0.5, 1.5)) == to_array(
+            Array[float], (0.5, 1.5), compact=True)
+        assert inst == (0.5, 1.5)
+        assert to_array(Array[float], [1, 1.5], compact=True).seq == [1, 1.5]
+        inst = ATestArray([1, 2], compact=True)
+        assert list(inst.seq) == [1, 2]
+        assert inst == [1, 2]
+        assert ATestArray([2 ** 64], compact=True).seq == [2 ** 64]
+        inst = to_array(Array[str], ["x" * 3, "".join("xxx")], compact=True)
+        assert inst == ["xxx", "xxx"]
+        assert inst[0] is inst[1]
+        if sys.version_info < (3,):
+            return
+        assert isinstance(ATestArray([1, 2], compact=True).seq, array.array)
+        inst = to_array(Array[bool], [True, False], compact=True)
+        assert isinstance(inst.seq, memoryview)
+        assert inst[0] is True
+        assert inst == [True, False]
+        assert pickle.loads(pickle.dumps(inst)) == [True, False]
+
+    def test_to_array_iterator(self):
+        inst = to_array(Array[float], (x / 2.0 for x in range(5)))
+        assert inst == [0.0, 0.5, 1.0, 1.5, 2.0]
+        inst = ATestArray(iter(range(10000)))
+        assert len(inst) == 10000
+        assert inst[9999] == 9999
+        if sys.version_info >= (3,):
+            assert isinstance(inst.seq, array.array)
+            inst = to_array(Array[bool], (x > 0 for x in range(3)))
+            assert isinstance(inst.seq, memoryview)
+            assert list(inst) == [False, True, True]
+        # Big ints in the second chunk mean we have to fall back to a list
+        inst = ATestArray(iter(list(range(5000)) + [2 ** 64]))
+        assert inst.seq == list(range(5000)) + [2 ** 64]
+        # So do mixed types
+        inst = to_array(Array[float], iter([0.5, 1]))
+        assert inst.seq == [0.5, 1]
+        assert inst.seq[1].__class__ is int
+        inst = to_array(Array[str], ("x%d" % (i % 2) for i in range(4)),
+                        compact=True)
+        assert inst == ["x0", "x1", "x0", "x1"]
+        assert inst[0] is inst[2]
+        assert to_array(Array[int], iter([])) == []
+
+    def test_array_builder(self):
+        builder = ArrayBuilder[float]()
+        assert len(builder) == 0
+        assert builder.freeze() == []
+        for i in range(3):
+            builder.append(i / 2.0)
+        builder.extend(x / 2.0 for x in range(3, 5))
+        assert len(builder) == 5
+        inst = builder.freeze()
+        assert isinstance(inst, Array)
+        assert inst.typ is float
+        assert inst == [0.0, 0.5, 1.0, 1.5, 2.0]
+        assert isinstance(inst.seq, array.array)
+        # No copy on freeze, and frozen Arrays don't see later appends
+        assert inst.seq is builder._storage
+        assert builder.freeze() is inst
+        builder.append(2.5)
+        assert inst == [0.0, 0.5, 1.0, 1.5, 2.0]
+        assert builder.freeze() == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5]
+        # Usable wherever to_array is
+        assert to_array(Array[float], builder) is builder.freeze()
+        with self.assertRaises(AssertionError):
+            to_array(Array[int], builder)
+        with self.assertRaises(AssertionError):
+            ArrayBuilder().append(1)
+        builder = ArrayBuilder[str]()
+        builder.extend(["a", "b"])
+        assert builder.freeze() == ["a", "b"]
+        # Elements that can't be packed make it fall back to a list
+        builder = ArrayBuilder[int]()
+        builder.extend([1, 2])
+        inst = builder.freeze()
+        builder.append(2 ** 64)
+        builder.extend(iter([1.5, 3]))
+        assert builder.freeze() == [1, 2, 2 ** 64, 1.5, 3]
+        assert inst == [1, 2]
+        builder = ArrayBuilder[int]()
+        builder.append(1)
+        builder.extend([2, 1.5])
+        assert builder.freeze() == [1, 2, 1.5]
+        if sys.version_info >= (3,):
+            builder = ArrayBuilder[bool]()
+            builder.extend([True, False])
+            inst = builder.freeze()
+            assert isinstance(inst.seq, memoryview)
+            builder.append(True)
+            assert list(inst) == [True, False]
+            assert list(builder.freeze()) == [True, False, True]
+            builder.append(None)
+            assert builder.freeze() == [True, False, True, None]
+
+    def test_array_builder_numpy(self):
+        builder = ArrayBuilder[np.int32]()
+        builder.append(1)
+        builder.extend(iter(range(2, 5000)))
+        builder.extend(np.arange(5000, 10000))
+        assert len(builder) == 9999
+        # Capacity doubles rather than growing by each append
+        assert len(builder._storage) < 20000
+        inst = builder.freeze()
+        assert isinstance(inst.seq, np.ndarray)
+        assert inst.seq.dtype == np.int32
+        assert inst.seq.base is builder._storage
+        np.testing.assert_array_equal(inst.seq, np.arange(1, 10000))
+
+    def test_pickle(self):
+        inst = Array[float]([1.0, 2.5])
+        unpickled = pickle.loads(pickle.dumps(inst))
+        assert unpickled == inst
+        assert unpickled.typ is float
+
 
 class TestTable(unittest.TestCase):
     def setUp(self):
@@ -426,6 +1083,64 @@ class TestTable(unittest.TestCase):
             "LayoutTable(name=Array(['BLOCK']), mri=Array(['MRI']), x=Array([0.5]), y=Array([2.5]), visible=Array([True]))"
         layout.mri = Array[str]()
 
+    def test_table_rows(self):
+        with self.assertRaises(AssertionError):
+            self.t(Array[str](["A"]), Array[str](), Array[float](),
+                   Array[float](), Array[bool]())
+        layout = self.t(Array[str](["A", "B", "C"]),
+                        Array[str](["M1", "M2", "M3"]),
+                        Array[float]([1.0, 0.5, 0.5]),
+                        Array[float]([2.0, 3.0, 4.0]),
+                        Array[bool]([True, False, True]))
+        assert len(layout) == 3
+        assert layout[-1] == ["C", "M3", 0.5, 4.0, True]
+        assert list(layout) == [
+            ("A", "M1", 1.0, 2.0, True),
+            ("B", "M2", 0.5, 3.0, False),
+            ("C", "M3", 0.5, 4.0, True)]
+        assert list(layout[1:].name) == ["B", "C"]
+        visible = layout.where(np.asarray(layout.visible))
+        assert list(visible.name) == ["A", "C"]
+        assert list(visible.x) == [1.0, 0.5]
+        assert list(layout.sort_by("x").name) == ["B", "C", "A"]
+        assert list(layout.sort_by("x", reverse=True).name) == ["A", "B", "C"]
+        # Appending grows the columns in place of copying them
+        first = layout.x
+        layout.append_rows([("D", "M4", 5.0, 6.0, False)])
+        grown = layout.x
+        layout.append_rows([("E", "M5", 7.0, 8.0, True)] * 2)
+        assert len(layout) == 6
+        assert layout[5] == ["E", "M5", 7.0, 8.0, True]
+        assert list(layout.mri) == ["M1", "M2", "M3", "M4", "M5", "M5"]
+        assert np.shares_memory(np.asarray(grown), np.asarray(layout.x))
+        assert list(first) == [1.0, 0.5, 0.5]
+        assert list(grown) == [1.0, 0.5, 0.5, 5.0]
+        # Rows with the wrong number of values are rejected, not truncated
+        with self.assertRaises(ValueError) as cm:
+            layout.append_rows([("F", "M6", 9.0, 10.0, True), ("G", "M7")])
+        assert str(cm.exception) == "Row 1 has 2 values, expected 5"
+        assert len(layout) == 6
+        # Replacing a column means checking the lengths again
+        layout.mri = Array[str]()
+        with self.assertRaises(AssertionError):
+            len(layout)
+
+
+    def test_table_init_order(self):
+        t = self.t
+
+        class Reordered(t):
+            call_types = collections.OrderedDict(
+                (k, t.call_types[k]) for k in reversed(list(t.call_types)))
+
+        layout = Reordered(Array[str](["A", "B"]),
+                           Array[str](["M1", "M2"]),
+                           Array[float]([1.0, 0.5]),
+                           Array[float]([2.0, 3.0]),
+                           Array[bool]([True, False]))
+        assert layout[0] == [True, 2.0, 1.0, "M1", "A"]
+        assert list(layout[1:].name) == ["B"]
+        assert list(layout.sort_by("x").mri) == ["M2", "M1"]
 
 class TestDict(unittest.TestCase):
     def setUp(self):
@@ -1,12 +1,22 @@
+import datetime
+import io
+import socket
+import struct
+import sys
 from collections import OrderedDict
+from decimal import Decimal
 import numpy as np
 import unittest
 
 from enum import Enum
 
 from annotypes import Anno, Array, Mapping, Union, Sequence, Any, \
-    Serializable, deserialize_object, serialize_object, FrozenOrderedDict, \
-    json_encode, json_decode
+    Serializable, deserialize_object, deserialize_typed, serialize_object, \
+    FrozenOrderedDict, json_encode, json_encode_to, json_decode, \
+    json_decode_object, register_serializer, serialize_ndarray_base64, \
+    deserialize_ndarray, BinaryCodec, binary_encode, binary_decode, \
+    JSONCodec
+from annotypes._frozen_dict import key_tuple
 
 with Anno("A Boo"):
     ABoo = int
@@ -64,6 +74,50 @@ class NestedSerializable(Serializable):
         self.dsarray = ADSArray(dsarray)
 
 
+with Anno("An A"):
+    AA = int
+with Anno("A B"):
+    AB = str
+
+
+class OrderedBase(Serializable):
+    def __init__(self, a, b):
+        # type: (AA, AB) -> None
+        self.a = a
+        self.b = b
+
+
+@Serializable.register_subclass("reordered:1.0")
+class ReorderedSerializable(OrderedBase):
+    """Inherits __init__, but has call_types in a different order"""
+    call_types = OrderedDict([("b", AB), ("a", AA)])
+
+
+class Colour(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+with Anno("A Colour"):
+    AColour = Colour
+with Anno("Some Positions"):
+    APositions = Array[float]
+with Anno("Some Dummies by name"):
+    ADummies = Mapping[str, DummySerializable]
+
+
+@Serializable.register_subclass("typed:1.0")
+class TypedSerializable(Serializable):
+    """Doesn't convert anything itself, leaving it to deserialize_typed()"""
+
+    def __init__(self, colour, positions, dsarray, dummies):
+        # type: (AColour, APositions, ADSArray, ADummies) -> None
+        self.colour = colour
+        self.positions = positions
+        self.dsarray = dsarray
+        self.dummies = dummies
+
+
 class TestSerialization(unittest.TestCase):
 
     def setUp(self):
@@ -95,6 +149,197 @@ class TestSerialization(unittest.TestCase):
         assert x == self.expected
         x = serialize_object(ADSArray(self.s))
         assert x == [self.expected]
+        x = serialize_object(ADSArray([self.s, self.s])[1:])
+        assert x == [self.expected]
+        x = serialize_object(ANotCamel([1, 2, 3])[1:])
+        assert x == [2, 3]
+        x = serialize_object(ANotCamel([1, 2, 3], compact=True))
+        assert x == [1, 2, 3]
+
+    def test_generated_codecs(self):
+        DummySerializable.from_dict(self.expected).to_dict()
+        to_dict = Serializable._to_dict_lookup[DummySerializable]
+        from_dict_args = Serializable._from_dict_args_lookup[DummySerializable]
+        assert from_dict_args(self.expected) == (
+            3, {'a': 42, 'b': 42}, [42, 42])
+        # Missing and extra keys fall back to the generic path
+        assert from_dict_args(dict(boo=3)) is None
+        assert from_dict_args(dict(boo=3, bar={}, other=1)) is None
+        # Leaf typed fields with unexpected values still get serialized
+        s = DummySerializable(np.int32(3), {}, [])
+        d = s.to_dict()
+        assert d["boo"] == 3
+        assert d["boo"].__class__ is int
+        assert Serializable._to_dict_lookup[DummySerializable] is to_dict
+        with self.assertRaises(AssertionError):
+            DummySerializable.from_dict(dict(self.expected, typeid="bad"))
+
+    def test_from_dict_init_order(self):
+        d = OrderedDict([("typeid", "reordered:1.0"), ("b", "x"), ("a", 1)])
+        inst = ReorderedSerializable.from_dict(d)
+        assert (inst.a, inst.b) == (1, "x")
+        assert inst.to_dict() == d
+        from_dict_args = \
+            Serializable._from_dict_args_lookup[ReorderedSerializable]
+        # Args are given in the order __init__ takes them
+        assert from_dict_args(d) == (1, "x")
+
+    def test_register_serializer(self):
+        from annotypes import _serializable
+
+        class MyDate(datetime.date):
+            pass
+
+        @register_serializer(datetime.date)
+        def serialize_date(o, dict_cls):
+            return o.isoformat()
+
+        register_serializer(Decimal)(lambda o, dict_cls: str(o))
+        try:
+            assert serialize_object(datetime.date(2018, 1, 2)) == "2018-01-02"
+            # Subclasses use the serializer of their base
+            assert serialize_object(MyDate(2018, 1, 3)) == "2018-01-03"
+            assert serialize_object(
+                dict(a=[Decimal("1.5"), 2], b=None)) == dict(a=["1.5", 2],
+                                                             b=None)
+            # Arrays of registered types recurse
+            with Anno("Some dates"):
+                ADates = Array[datetime.date]
+            assert serialize_object(ADates([MyDate(2018, 1, 4)])) == [
+                "2018-01-04"]
+            assert json_encode([Decimal("0.1")]) == '["0.1"]'
+            # Leaves are returned unchanged
+            assert _serializable.find_serializer(int) is None
+            assert _serializable.find_serializer(str) is None
+        finally:
+            _serializable._registered_serializers.pop(datetime.date)
+            _serializable._registered_serializers.pop(Decimal)
+            _serializable._serializer_cache.clear()
+
+    def test_ndarray_base64(self):
+        from annotypes import _serializable
+
+        positions = APositions(np.linspace(0, 1, 1000))
+        t = TypedSerializable(Colour.RED, positions, ADSArray(), {})
+        register_serializer(np.ndarray)(serialize_ndarray_base64)
+        try:
+            s = json_encode(t)
+            assert '"positions": {"__ndarray__": "' in s
+            assert len(s) < len(json_encode(positions.seq.tolist()))
+            f = io.StringIO() if sys.version_info >= (3,) else io.BytesIO()
+            json_encode_to(f, t)
+            assert f.getvalue() == s
+            for n in (json_decode_object(s),
+                      deserialize_typed(json_decode(s))):
+                assert np.asarray(n.positions).dtype == np.float64
+                assert np.array_equal(n.positions, positions.seq)
+            # Slices, other dtypes and shapes
+            ints = Array[np.int32](np.arange(10, dtype=np.int32))[2:5]
+            assert deserialize_ndarray(serialize_object(ints)).tolist() == [
+                2, 3, 4]
+            grid = np.arange(6, dtype=">f4").reshape(2, 3)
+            decoded = json_decode_object(json_encode({"grid": grid}))["grid"]
+            assert decoded.dtype == np.float32 and decoded.dtype.isnative
+            assert decoded.shape == (2, 3)
+            assert np.array_equal(decoded, grid)
+            # Objects can't be sent as bytes
+            objects = np.array([Colour.RED, None], dtype=object)
+            assert serialize_object(objects) == ["red", None]
+        finally:
+            _serializable._registered_serializers.pop(np.ndarray)
+            _serializable._serializer_cache.clear()
+        assert serialize_object(positions)[:2] == [0.0, 1 / 999.]
+
+    def test_binary_codec(self):
+        for o in (None, True, False, 0, 127, 128, -1, -129, 2 ** 31, -2 ** 63,
+                  2 ** 70, -2 ** 70, 1.5, u"caf\xe9", [1, [2.5, None]],
+                  {u"a": {u"b": [u"c"]}}):
+            assert binary_decode(binary_encode(o)) == o
+        assert binary_encode(5) == b"\x05"
+        positions = APositions(np.linspace(0, 1, 1000))
+        t = TypedSerializable(Colour.RED, positions, ADSArray([self.s]), {
+            "x": DummySerializable(2, {}, list(range(100)))})
+        data = binary_encode(t)
+        assert len(data) < len(json_encode(t)) / 2
+        n = binary_decode(data)
+        assert n.to_dict() == t.to_dict()
+        assert isinstance(n.dsarray[0], DummySerializable)
+        # Numeric Arrays wrap the message without copying
+        assert n.positions.seq.dtype == np.float64
+        assert not n.positions.seq.flags.owndata
+        assert list(n.dummies["x"].NOT_CAMEL) == list(range(100))
+        assert list(binary_decode(binary_encode(positions[10:13]))) == list(
+            positions[10:13])
+        # Multi-dimensional numpy arrays are sent as nested lists
+        grid = Array[np.float64](np.arange(6.0).reshape((2, 3)))
+        assert list(binary_decode(binary_encode(grid))) == [
+            [0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]
+        # Or the buffers are sent out of band
+        buffers = []
+        data = binary_encode(t, buffers.append)
+        # Python2 can't pack the ints, so only sends the floats as a buffer
+        assert len(buffers) == (2 if sys.version_info >= (3,) else 1)
+        assert len(data) < len(binary_encode(t)) - 8000
+        buffers = [bytearray(b) for b in buffers]
+        n = binary_decode(data, buffers)
+        buffers[0][:8] = struct.pack("<d", 42.0)
+        assert n.positions[0] == 42.0
+        with self.assertRaises(ValueError):
+            binary_decode(data)
+        # Typeids are only sent by name once per codec
+        sender, receiver = BinaryCodec(["foo:1.0"]), BinaryCodec(["foo:1.0"])
+        first = sender.encode(t)
+        second = sender.encode(t)
+        assert b"typed:1.0" in first
+        assert b"typed:1.0" not in second and b"foo:1.0" not in first
+        assert receiver.decode(first).to_dict() == t.to_dict()
+        assert receiver.decode(second).to_dict() == t.to_dict()
+        with self.assertRaises(ValueError):
+            binary_decode(sender.encode(t))
+        with self.assertRaises(ValueError):
+            binary_decode(data + b"\x00")
+        with self.assertRaises(TypeError):
+            binary_encode(object())
+
+    def test_json_codec(self):
+        sender, receiver = JSONCodec(), JSONCodec()
+        nested = NestedSerializable(2, [self.s, DummySerializable(
+            4, {"d": self.s}, [5])])
+        first = sender.encode(nested)
+        # Children are sent first, so get the schema
+        assert first == (
+            '{"#": [1, 2, [{"#": [0, 3, {"a": 42, "b": 42}, [42, 42]], '
+            '"typeid": "foo:1.0", "fields": ["boo", "bar", "NOT_CAMEL"]}, '
+            '{"#": [0, 4, {"d": {"#": [0, 3, {"a": 42, "b": 42}, [42, 42]]}}, '
+            '[5]]}]], "typeid": "nested:1.0", "fields": ["boo", "dsarray"]}'
+        ).replace('{"a": 42, "b": 42}', json_encode(self.s.bar))
+        second = sender.encode([nested, {"x": None}])
+        assert "fields" not in second
+        assert len(second) < len(json_encode([nested, {"x": None}])) * 0.6
+        for data in (first, second):
+            n = receiver.decode(data)
+            if isinstance(n, list):
+                assert n[1] == {"x": None}
+                n = n[0]
+            assert n.to_dict() == nested.to_dict()
+            assert isinstance(n.dsarray[1].bar["d"], DummySerializable)
+        # Fields in a different order to ours go through from_dict
+        n = JSONCodec().decode(
+            '{"#": [0, [1], {}, 3], "typeid": "foo:1.0", '
+            '"fields": ["NOT_CAMEL", "bar", "boo"]}')
+        assert n.to_dict() == DummySerializable(3, {}, [1]).to_dict()
+        with self.assertRaises(ValueError):
+            JSONCodec().decode(second)
+        with self.assertRaises(ValueError):
+            sender.encode({"#": 1})
+        # The binary codec sends the same schema
+        data = BinaryCodec().encode(self.s)
+        assert b"NOT_CAMEL" in data
+        assert BinaryCodec().decode(data).to_dict() == self.expected
+        # call_types in a different order to __init__ go by name
+        for codec in (JSONCodec, BinaryCodec):
+            r = codec().decode(codec().encode(ReorderedSerializable(1, "x")))
+            assert (r.a, r.b) == (1, "x")
 
     def test_no_args(self):
         self.expected["extra"] = "thing"
@@ -122,6 +367,10 @@ class TestSerialization(unittest.TestCase):
         items = [("typeid", "me"), ("a", 1), ("b", "two")]
         d = FrozenOrderedDict(items)
         assert list(d) == list(d.keys()) == ["typeid", "a", "b"]
+        # keys() is a new list each time, the hot paths use a cached tuple
+        assert d.keys() is not d.keys()
+        assert key_tuple(d) is key_tuple(d) == ("typeid", "a", "b")
+        assert key_tuple(dict(a=1)) == ("a",)
         assert d.items() == list(d.iteritems()) == items
         assert d.values() == list(d.itervalues()) == ["me", 1, "two"]
         with self.assertRaises(TypeError):
@@ -148,6 +397,112 @@ class TestSerialization(unittest.TestCase):
         assert json_encode(s1) == \
             '{"typeid": "foo:1.0", "boo": 3, "bar": {}, "NOT_CAMEL": [3, 4]}'
 
+    def test_json_encode_to(self):
+        from annotypes import _serializable
+
+        class MyEnum(Enum):
+            ME = "me"
+
+        nested = NestedSerializable(2, [self.s, DummySerializable(
+            4, {"e": MyEnum.ME, 1: ValueError("x")}, np.arange(10000))])
+        for o in (self.s, nested, [1, "two", None, {"a": [nested]}],
+                  ANotCamel(np.arange(20000))[3:], "leaf"):
+            f = io.StringIO() if sys.version_info >= (3,) else io.BytesIO()
+            json_encode_to(f, o)
+            assert f.getvalue() == json_encode(o)
+        keyed = {True: 1, None: 2, 1.5: 3, 2: 4, "s": 5}
+        f = io.StringIO() if sys.version_info >= (3,) else io.BytesIO()
+        json_encode_to(f, keyed)
+        assert f.getvalue() == json_encode(keyed)
+        # Keys json can't encode are errors, rather than made into strings
+        for bad in ({(1, 2): 1}, {MyEnum.ME: 1}):
+            with self.assertRaises(TypeError):
+                json_encode(bad)
+            with self.assertRaises(TypeError):
+                json_encode_to(io.StringIO(), bad)
+
+        # Writes are bounded rather than one big string
+        writes = []
+
+        class Writer(object):
+            def write(self, s):
+                writes.append(len(s))
+
+        json_encode_to(Writer(), ANotCamel(np.arange(1000000)))
+        assert len(writes) > 1
+        assert max(writes) < 2 * _serializable.WRITE_BUFFER
+
+        # Sockets are written to with sendall
+        a, b = socket.socketpair()
+        try:
+            json_encode_to(a, self.s)
+            a.close()
+            received = b.makefile("rb").read()
+        finally:
+            b.close()
+        assert received.decode("utf-8") == json_encode(self.s)
+
+    def test_json_decode_object(self):
+        nested = NestedSerializable(2, [self.s, self.s])
+        n = json_decode_object(json_encode(nested), NestedSerializable)
+        assert n.to_dict() == nested.to_dict()
+        assert isinstance(n.dsarray[1], DummySerializable)
+        assert list(n.dsarray[0].NOT_CAMEL) == [42, 42]
+        assert isinstance(
+            json_decode_object('{"typeid": "empty:1.0"}'), EmptySerializable)
+        # Objects without a typeid, or with it later or fields out of order
+        o = json_decode_object('[{"a": 1}, {"boo": 3, "typeid": "foo:1.0", '
+                               '"NOT_CAMEL": [1], "bar": {"c": 2}}]')
+        assert o[0] == {"a": 1}
+        assert isinstance(o[0], FrozenOrderedDict)
+        assert isinstance(o[1], DummySerializable)
+        assert o[1].bar == {"c": 2}
+        with self.assertRaises(TypeError) as cm:
+            json_decode_object('{"typeid": "foo:1.0", "boo": 3}')
+        assert "foo:1.0 raised error" in str(cm.exception)
+        with self.assertRaises(TypeError):
+            json_decode_object('{"typeid": "unknown:1.0"}')
+        with self.assertRaises(AssertionError):
+            json_decode_object(json_encode(self.s), NestedSerializable)
+        # call_types in a different order to __init__ go by name
+        r = json_decode_object(json_encode(ReorderedSerializable(1, "x")))
+        assert (r.a, r.b) == (1, "x")
+
+    def test_deserialize_typed(self):
+        t = TypedSerializable(
+            Colour.BLUE, APositions([1.5, 2.5]), ADSArray([self.s]),
+            {"x": self.s})
+        d = json_decode(json_encode(t))
+        n = deserialize_typed(d, TypedSerializable)
+        assert n.colour is Colour.BLUE
+        assert n.positions.typ is float
+        assert n.positions.seq.dtype == np.float64
+        assert list(n.positions) == [1.5, 2.5]
+        assert n.dsarray.typ is DummySerializable
+        assert isinstance(n.dsarray[0], DummySerializable)
+        assert n.dsarray[0].to_dict() == self.expected
+        assert isinstance(n.dummies["x"], DummySerializable)
+        assert n.to_dict() == t.to_dict()
+        # The plan is cached and skips fields that need no conversion
+        plan = Serializable._typed_plan_lookup[TypedSerializable]
+        assert list(plan) == ["colour", "positions", "dsarray", "dummies"]
+        assert list(Serializable._typed_plan_lookup[DummySerializable]) == [
+            "NOT_CAMEL"]
+        # Already converted values pass through
+        assert deserialize_typed(n) is n
+        n = deserialize_typed(dict(d, colour=Colour.RED, positions=None))
+        assert n.colour is Colour.RED
+        assert len(n.positions) == 0
+        with self.assertRaises(ValueError):
+            deserialize_typed(dict(d, colour="green"))
+        # Values that numpy would have to cast unsafely are left as they are
+        d = json_decode(json_encode(self.s))
+        for values in ([1.7, 2.2], ["3", "4"], [1.5, None]):
+            n = deserialize_typed(dict(d, NOT_CAMEL=values))
+            assert n.NOT_CAMEL.seq == values
+        n = deserialize_typed(dict(d, NOT_CAMEL=[3, True]))
+        assert n.NOT_CAMEL.seq.dtype == np.int64
+
     def test_exception_serialize(self):
         s = json_encode({"message": ValueError("Bad result")})
         assert s == '{"message": "ValueError: Bad result"}'